@@ -0,0 +1,80 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Каталог меняется редко и читается чаще всего — эти чтения можно отдавать репликам.
+# Корзины, заказы, остатки и пользователи всегда читаются с основной базы. Отзывы
+# и таблица итоговых цен пишутся прямо в запросах покупателей — их тоже читаем с основной.
+CATALOG_MODELS = {
+    "main.category",
+    "main.product",
+    "main.ingredient",
+    "main.productingredient",
+    "main.banner",
+    "main.coffeeshop",
+    "main.pickuppoint",
+    "main.promotion",
+    "main.bestseller",
+}
+
+# Запрос уже писал в основную базу: до его конца реплики не читаем
+_pinned = ContextVar("pinned_to_primary", default=False)
+
+
+def release_primary():
+    """Снова разрешает чтения с реплик — в начале каждого запроса (PrimaryPinMiddleware)."""
+    _pinned.set(False)
+
+
+class PrimaryPinMiddleware:
+    """
+    Границы «запроса» для PrimaryReplicaRouter: после первой записи
+    остаток запроса читает каталог с основной базы, иначе только что
+    записанный отзыв или пересчитанный рейтинг пришёл бы с отстающей реплики.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        release_primary()
+        try:
+            return self.get_response(request)
+        finally:
+            release_primary()
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтения каталога — на случайную реплику (алиасы replica_*), всё
+    остальное и любые записи — на основную базу. Внутри транзакции на
+    основной базе читается тоже она: так запись видна сразу, а
+    select_for_update не уходит на реплику. После записи чтения остаются
+    на основной базе до конца запроса.
+    """
+
+    def __init__(self):
+        self.replicas = [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+    def db_for_read(self, model, **hints):
+        if (
+            not self.replicas
+            or model._meta.label_lower not in CATALOG_MODELS
+            or _pinned.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
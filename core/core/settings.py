@@ -13,11 +13,42 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Переменные окружения можно положить в core/.env (см. .env.example);
+# уже заданные в окружении значения не перезаписываются
+load_dotenv(BASE_DIR / '.env')
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name, default=''):
+    return [item.strip() for item in os.environ.get(name, default).split(',') if item.strip()]
+
 
-ALLOWED_HOSTS = ['*']
+# Профиль: dev — локальная разработка, prod — боевой сервер
+PROFILE = os.environ.get('DJANGO_PROFILE', 'dev')
+if PROFILE not in ('dev', 'prod'):
+    raise ImproperlyConfigured(f"DJANGO_PROFILE должен быть dev или prod, а не {PROFILE!r}")
+
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    if PROFILE == 'prod':
+        raise ImproperlyConfigured("В профиле prod нужно задать SECRET_KEY")
+    SECRET_KEY = 'django-insecure-dev-only-key'
+
+DEBUG = env_bool('DEBUG', PROFILE == 'dev')
+
+ALLOWED_HOSTS = env_list('ALLOWED_HOSTS', '*' if PROFILE == 'dev' else '')
 
 
 # Application definition
@@ -38,6 +69,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.routers.PrimaryPinMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -71,13 +103,104 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=sqlite (по умолчанию) или postgres
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    def postgres_database(host, port):
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'coffee'),
+            'USER': os.environ.get('DB_USER', 'coffee'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': host,
+            'PORT': port,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+        if env_bool('DB_POOL', True):
+            # Пул psycopg 3 в каждом воркере: соединения не открываются на каждый запрос.
+            # С пулом Django требует CONN_MAX_AGE = 0
+            database['CONN_MAX_AGE'] = 0
+            database['OPTIONS']['pool'] = {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            }
+        else:
+            database['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+        return database
+
+    DATABASES = {
+        'default': postgres_database(os.environ.get('DB_HOST', 'localhost'), os.environ.get('DB_PORT', '5432')),
+    }
+    # Реплики только для чтения: DB_REPLICA_HOSTS=replica1,replica2:5433
+    for number, address in enumerate(env_list('DB_REPLICA_HOSTS'), start=1):
+        host, _, port = address.partition(':')
+        DATABASES[f'replica_{number}'] = {
+            **postgres_database(host, port or DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            # Соединение переиспользуется между запросами и проверяется перед повторным использованием
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Транзакция сразу берёт блокировку на запись: без "database is locked"
+                # при повышении блокировки чтения до записи посреди транзакции
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Неизвестный DB_ENGINE: {DB_ENGINE!r}")
+
+# Чтения каталога — на реплики, корзины и заказы — на основную базу (см. core.routers)
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter'] if len(DATABASES) > 1 else []
+
+# PRAGMA для каждого нового соединения SQLite (см. main.db)
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'normal'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # мс
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -20000)),  # отрицательное — в КиБ
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+    'temp_store': 'memory',
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# По умолчанию locmem; для нескольких воркеров укажите, например,
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache и
+# CACHE_LOCATION=redis://127.0.0.1:6379/1 (или FileBasedCache и путь к папке).
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'coffee'),
     }
 }
 
+# Главная страница кэшируется до инвалидации сигналами (None — без срока)
+INDEX_CACHE_TIMEOUT = None
+
+# Карточки товаров кэшируются по версии товара (main.invalidation); срок —
+# страховка на случай пропущенной инвалидации
+PRODUCT_DETAIL_CACHE_TIMEOUT = int(os.environ.get('PRODUCT_DETAIL_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Остаток, начиная с которого карточка показывает «мало на складе»
+LOW_STOCK_THRESHOLD = 5
+
+# Cache-Control: max-age для списков каталога (ETag и Last-Modified — всегда)
+CATALOG_CACHE_MAX_AGE = int(os.environ.get('CATALOG_CACHE_MAX_AGE', 60))
+
+# Сколько держится резерв товара, положенного в корзину
+STOCK_RESERVATION_TTL = timedelta(minutes=15)
 
 
 # Password validation
@@ -141,29 +264,29 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    # orjson, если установлен; иначе стандартный json (см. main.renderers)
+    'DEFAULT_RENDERER_CLASSES': [
+        'main.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 
-SECRET_KEY = "bsipgm8=cc-rrox%21xsyvgh2tc9-h+)3gju)4+_-y_aq+)v"
-DEBUG=True
-
-
-
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'user.User'
 LOGIN_URL = 'user_login'
 
 # Email
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_HOST = "smtp.gmail.com"
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
-EMAIL_USE_SSL = False
-EMAIL_HOST_USER = "ayanaabdyraeva@gmail.com"
-EMAIL_HOST_PASSWORD = "mauo nawg fmll baxp"
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
+EMAIL_USE_TLS = env_bool('EMAIL_USE_TLS', True)
+EMAIL_USE_SSL = env_bool('EMAIL_USE_SSL', False)
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
 # CORS
 CORS_ORIGIN_ALLOW_ALL = True
@@ -22,8 +22,8 @@ class ProductIngredientInline(admin.TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "price", "new_price", "category")
-    search_fields = ("title",)
+    list_display = ("id", "sku", "title", "price", "new_price", "category")
+    search_fields = ("title", "sku")
     list_filter = ("category",)
     inlines = [ProductIngredientInline]
 
@@ -64,7 +64,7 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItems)
 class OrderItemsAdmin(admin.ModelAdmin):
-    list_display = ("id", "order", "product", "quantity")
+    list_display = ("id", "order", "product", "quantity", "price", "line_total")
     search_fields = ("order__id", "product__title")
     ordering = ("id",)
 
@@ -102,13 +102,49 @@ class ProductIngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
-    list_display = ("id", "product", "quantity")
+    list_display = ("id", "product", "quantity", "reserved")
     search_fields = ("product__title",)
     ordering = ("id",)
 
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "product", "quantity", "expires_at")
+    list_filter = ("expires_at",)
+    search_fields = ("product__title", "user__email")
+    ordering = ("expires_at",)
+
+
 @admin.register(PickupPoint)
 class PickupPointAdmin(admin.ModelAdmin):
     list_display = ("id", "title", "address", "phone")
     search_fields = ("title", "address")
     ordering = ("id",)
+
+
+@admin.register(ProductSalesRollup)
+class ProductSalesRollupAdmin(admin.ModelAdmin):
+    list_display = ("id", "granularity", "bucket", "product", "revenue", "units", "order_count")
+    list_filter = ("granularity",)
+    ordering = ("-bucket",)
+
+
+@admin.register(CategorySalesRollup)
+class CategorySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ("id", "granularity", "bucket", "category", "revenue", "units", "order_count")
+    list_filter = ("granularity", "category")
+    ordering = ("-bucket",)
+
+
+@admin.register(PaymentSalesRollup)
+class PaymentSalesRollupAdmin(admin.ModelAdmin):
+    list_display = ("id", "granularity", "bucket", "payment_method", "revenue", "units", "order_count")
+    list_filter = ("granularity", "payment_method")
+    ordering = ("-bucket",)
+
+
+@admin.register(BestSeller)
+class BestSellerAdmin(admin.ModelAdmin):
+    list_display = ("id", "category", "rank", "product", "units")
+    list_filter = ("category",)
+    ordering = ("category", "rank")
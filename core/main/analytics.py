@@ -0,0 +1,183 @@
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import CategorySalesRollup, Order, OrderItems, PaymentSalesRollup, ProductSalesRollup
+
+TRUNCATE = {
+    "hour": TruncHour,
+    "day": TruncDay,
+}
+
+# Разрез отчёта -> (таблица, поле разреза)
+ROLLUPS = {
+    "product": (ProductSalesRollup, "product"),
+    "category": (CategorySalesRollup, "category"),
+    "payment_method": (PaymentSalesRollup, "payment_method"),
+}
+
+ROLLUP_BATCH_SIZE = 1000
+
+
+def bucket_start(moment, granularity):
+    """Начало часа или дня (в локальной зоне) — так же, как TruncHour/TruncDay в запросе."""
+    local = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    return local.replace(hour=0) if granularity == "day" else local
+
+
+def _increment(model, key, rows):
+    """
+    Прибавляет строки (granularity, bucket, key, revenue, units, order_count)
+    к накопленным одним INSERT ... ON CONFLICT DO UPDATE: параллельные оплаты
+    не теряют обновлений, и не нужно заранее читать существующие строки.
+    """
+    names = ["granularity", "bucket", key, "revenue", "units", "order_count"]
+    fields = [model._meta.get_field(name) for name in names]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = [quote(field.column) for field in fields]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({', '.join(columns[:3])}) DO UPDATE SET "
+        + ", ".join(f"{column} = {table}.{column} + excluded.{column}" for column in columns[3:])
+    )
+    params = [
+        [field.get_db_prep_value(value, connection) for field, value in zip(fields, row)]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def record_paid_order(order):
+    """
+    Добавляет оплаченный заказ в часовые и дневные сводки: по товарам,
+    категориям и способам оплаты. Период определяется временем оплаты
+    (paid_at), как и при пересборке командой backfill_sales_rollups: заказ,
+    оплаченный позже, не попадает в уже закрытое окно.
+    """
+    products = {}
+    categories = {}
+    revenue = 0
+    units = 0
+    for product_id, category_id, quantity, line_total in OrderItems.objects.filter(order=order).values_list(
+        "product_id", "product__category_id", "quantity", "line_total"
+    ):
+        for totals, pk in ((products, product_id), (categories, category_id)):
+            current = totals.get(pk, (0, 0))
+            totals[pk] = (current[0] + line_total, current[1] + quantity)
+        revenue += line_total
+        units += quantity
+
+    product_rows, category_rows, payment_rows = [], [], []
+    for granularity in TRUNCATE:
+        bucket = bucket_start(order.paid_at, granularity)
+        product_rows += [(granularity, bucket, pk, *totals, 1) for pk, totals in products.items()]
+        category_rows += [(granularity, bucket, pk, *totals, 1) for pk, totals in categories.items()]
+        payment_rows.append((granularity, bucket, order.payment_method or "", revenue, units, 1))
+
+    with transaction.atomic(savepoint=False):
+        if product_rows:
+            _increment(ProductSalesRollup, "product", product_rows)
+            _increment(CategorySalesRollup, "category", category_rows)
+        _increment(PaymentSalesRollup, "payment_method", payment_rows)
+
+
+def _aggregate_rows(start, end):
+    """(модель, строки) для всех сводок, посчитанные GROUP BY по заказам, оплаченным в период."""
+    items = OrderItems.objects.filter(order__status__in=Order.PAID_STATUSES, order__paid_at__isnull=False)
+    orders = Order.objects.filter(status__in=Order.PAID_STATUSES, paid_at__isnull=False)
+    if start:
+        items = items.filter(order__paid_at__gte=start)
+        orders = orders.filter(paid_at__gte=start)
+    if end:
+        items = items.filter(order__paid_at__lt=end)
+        orders = orders.filter(paid_at__lt=end)
+
+    for granularity, trunc in TRUNCATE.items():
+        for model, key, source in (
+            (ProductSalesRollup, "product", "product"),
+            (CategorySalesRollup, "category", "product__category"),
+        ):
+            grouped = (
+                items.annotate(bucket=trunc("order__paid_at"))
+                .values("bucket", source)
+                .annotate(revenue=Sum("line_total"), units=Sum("quantity"), order_count=Count("order", distinct=True))
+                .order_by()
+            )
+            yield model, (
+                model(**{
+                    "granularity": granularity, "bucket": row["bucket"], f"{key}_id": row[source],
+                    "revenue": row["revenue"], "units": row["units"], "order_count": row["order_count"],
+                })
+                for row in grouped.iterator()
+            )
+
+        grouped = (
+            orders.annotate(bucket=trunc("paid_at"), method=Coalesce("payment_method", Value("")))
+            .values("bucket", "method")
+            .annotate(
+                revenue=Coalesce(
+                    Sum("items__line_total"), Value(0), output_field=models.DecimalField(max_digits=14, decimal_places=2)
+                ),
+                units=Coalesce(Sum("items__quantity"), Value(0)),
+                order_count=Count("id", distinct=True),
+            )
+            .order_by()
+        )
+        yield PaymentSalesRollup, (
+            PaymentSalesRollup(
+                granularity=granularity, bucket=row["bucket"], payment_method=row["method"],
+                revenue=row["revenue"], units=row["units"], order_count=row["order_count"],
+            )
+            for row in grouped.iterator()
+        )
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Пересобирает сводки за период [start, end) (или за всё время) по таблицам
+    заказов. Границы должны совпадать с началом дня, иначе дневные строки на
+    краях окажутся неполными. Возвращает число записанных строк.
+    """
+    written = 0
+    with transaction.atomic():
+        for model, _ in ROLLUPS.values():
+            stale = model.objects.all()
+            if start:
+                stale = stale.filter(bucket__gte=start)
+            if end:
+                stale = stale.filter(bucket__lt=end)
+            stale.delete()
+
+        for model, rows in _aggregate_rows(start, end):
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= ROLLUP_BATCH_SIZE:
+                    written += len(model.objects.bulk_create(batch))
+                    batch = []
+            if batch:
+                written += len(model.objects.bulk_create(batch))
+    return written
+
+
+def sales_report(granularity, group_by, start, end):
+    """
+    Продажи по периодам из сводок. group_by: product, category,
+    payment_method или total (итог по всем заказам).
+    """
+    model, key = ROLLUPS.get(group_by, (PaymentSalesRollup, None))
+    rows = model.objects.filter(granularity=granularity, bucket__gte=start, bucket__lt=end)
+    fields = ["bucket"]
+    extra = {}
+    if key:
+        fields.append(key)
+        if key != "payment_method":
+            extra["title"] = F(f"{key}__title")
+    return list(
+        rows.values(*fields, **extra)
+        .annotate(revenue=Sum("revenue"), units=Sum("units"), order_count=Sum("order_count"))
+        .order_by(*fields)
+    )
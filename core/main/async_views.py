@@ -0,0 +1,96 @@
+"""
+Async-версии самых нагруженных эндпоинтов каталога для запуска под ASGI
+(core.asgi). Ответы, включая ETag, Last-Modified, Cache-Control и 304,
+совпадают с JSON-ответами синхронных DRF-представлений из main.views.
+
+Главная и карточка товара при попадании в кэш обходятся async API кэша, без
+потоков; при промахе в поток уходит только сборка данных. Список товаров
+ходит в базу всегда, а фильтры django-filter и поиск синхронные, поэтому вся
+его работа с базой — один вызов sync_to_async на запрос: async ORM сам
+выполняет каждый запрос через sync_to_async, и отдельные async-запросы
+стоили бы по переходу в поток каждый.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from .cache import aget_index_payload, aget_product_detail
+from .conditional import add_validator_headers, not_modified
+from .renderers import FastJSONRenderer
+from .serializers import ProductListSerializer
+from .views import ProductDetailAPIView, ProductListAPIView, absolute_cover, etag_matches
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(FastJSONRenderer().render(data), content_type="application/json", status=status)
+
+
+@require_GET
+async def index(request):
+    data, etag = await aget_index_payload()
+
+    if etag_matches(request, etag):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = json_response(data)
+    response["ETag"] = etag
+    return response
+
+
+def catalog_view(view_class, request, **kwargs):
+    """
+    Экземпляр синхронного представления для async-эндпоинта: фильтры,
+    пагинация и валидаторы (ETag, Last-Modified) берутся из него. Формат
+    ответа — JSON, поэтому ETag совпадает с JSON-ответом синхронной версии.
+    """
+    request = Request(request)
+    request.accepted_renderer = FastJSONRenderer()
+    return view_class(request=request, format_kwarg=None, args=(), kwargs=kwargs)
+
+
+def list_products(view):
+    """
+    Синхронная часть product_list: фильтры (category ищется в базе), поиск,
+    валидаторы и страница. Возвращает (etag, last_modified, data), где data —
+    None, если клиентская копия актуальна.
+    """
+    queryset = view.filter_queryset(view.get_queryset())
+    etag, last_modified = view.get_validators()
+    if not_modified(view.request, etag, last_modified) is not None:
+        return etag, last_modified, None
+    paginator = view.pagination_class()
+    page = paginator.paginate_queryset(queryset, view.request, view)
+    serializer = ProductListSerializer(page, many=True, context={"request": view.request})
+    return etag, last_modified, paginator.get_paginated_response(serializer.data).data
+
+
+@require_GET
+async def product_list(request):
+    view = catalog_view(ProductListAPIView, request)
+    try:
+        etag, last_modified, data = await sync_to_async(list_products)(view)
+    except exceptions.APIException as exc:
+        # Как exception_handler DRF: ошибки полей — как есть, остальное — в detail
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        return json_response(data, status=exc.status_code)
+
+    if data is None:
+        response = not_modified(request, etag, last_modified)
+    else:
+        response = json_response(data)
+    return add_validator_headers(response, etag, last_modified, view.get_cache_max_age())
+
+
+@require_GET
+async def product_detail(request, pk):
+    view = catalog_view(ProductDetailAPIView, request, pk=pk)
+    etag, last_modified = await view.aget_validators()
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        data = await aget_product_detail(pk)
+        if data is None:
+            return json_response({"detail": exceptions.NotFound.default_detail}, status=status.HTTP_404_NOT_FOUND)
+        response = json_response(absolute_cover(request, data))
+    return add_validator_headers(response, etag, last_modified, view.get_cache_max_age())
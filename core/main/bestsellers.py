@@ -0,0 +1,109 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import F, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .cache import invalidate_index_payload
+from .models import BestSeller, BestSellerWindow, ProductSalesRollup, ProductSalesWindow
+
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_TOP = 5
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def day_totals(first, last):
+    """{product_id: (units, revenue)} за дни first..last по дневным сводкам продаж."""
+    if first > last:
+        return {}
+    rows = (
+        ProductSalesRollup.objects.filter(
+            granularity="day",
+            bucket__gte=_day_start(first),
+            bucket__lt=_day_start(last + datetime.timedelta(days=1)),
+        )
+        .values("product")
+        .annotate(units=Sum("units"), revenue=Sum("revenue"))
+        .order_by()
+    )
+    return {row["product"]: (row["units"], row["revenue"]) for row in rows}
+
+
+def _apply(deltas):
+    """Сдвигает итоги окна на deltas {product_id: (units, revenue)} одним чтением и одним upsert."""
+    if not deltas:
+        return
+    current = {
+        row.product_id: row for row in ProductSalesWindow.objects.filter(product_id__in=deltas)
+    }
+    rows = []
+    for product_id, (units, revenue) in deltas.items():
+        row = current.get(product_id) or ProductSalesWindow(product_id=product_id)
+        row.units += units
+        row.revenue += revenue
+        rows.append(row)
+    ProductSalesWindow.objects.bulk_create(
+        [row for row in rows if row.units > 0],
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["units", "revenue"],
+    )
+    ProductSalesWindow.objects.filter(product_id__in=[row.product_id for row in rows if row.units <= 0]).delete()
+
+
+def advance_window(end, window_days=DEFAULT_WINDOW_DAYS, rebuild=False):
+    """
+    Сдвигает окно так, чтобы последним днём стал end. Если окно уже было
+    посчитано, прибавляются только новые дни и вычитаются выпавшие — по
+    одному запросу к дневным сводкам на каждое. Пересчёт с нуля — только при
+    первом запуске, смене длины окна или перерыве дольше окна.
+    """
+    start = end - datetime.timedelta(days=window_days - 1)
+    with transaction.atomic():
+        state = BestSellerWindow.objects.select_for_update().first()
+        if rebuild or state is None or state.window_days != window_days or state.end < start or state.end > end:
+            ProductSalesWindow.objects.all().delete()
+            _apply(day_totals(start, end))
+        else:
+            deltas = day_totals(state.end + datetime.timedelta(days=1), end)
+            for product_id, (units, revenue) in day_totals(state.start, start - datetime.timedelta(days=1)).items():
+                added = deltas.get(product_id, (0, 0))
+                deltas[product_id] = (added[0] - units, added[1] - revenue)
+            _apply(deltas)
+
+        if state is None:
+            BestSellerWindow.objects.create(window_days=window_days, start=start, end=end)
+        else:
+            state.window_days, state.start, state.end = window_days, start, end
+            state.save()
+
+
+def materialize(top=DEFAULT_TOP):
+    """Перезаписывает таблицу BestSeller: top-N всего каталога и top-N каждой категории."""
+    order = [F("units").desc(), F("revenue").desc(), F("product_id").asc()]
+    overall = ProductSalesWindow.objects.order_by(*order)[:top]
+    by_category = (
+        ProductSalesWindow.objects.annotate(
+            category_id=F("product__category_id"),
+            position=Window(RowNumber(), partition_by=F("product__category_id"), order_by=order),
+        )
+        .filter(position__lte=top)
+    )
+
+    rows = [
+        BestSeller(product_id=row.product_id, rank=rank, units=row.units)
+        for rank, row in enumerate(overall, start=1)
+    ]
+    rows += [
+        BestSeller(product_id=row.product_id, category_id=row.category_id, rank=row.position, units=row.units)
+        for row in by_category
+    ]
+    with transaction.atomic():
+        BestSeller.objects.all().delete()
+        BestSeller.objects.bulk_create(rows)
+    invalidate_index_payload()
+    return rows
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import uuid
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .invalidation import aproduct_detail_keys, forget_product_versions, product_detail_keys
+from .models import Banner, BestSeller, Category, CoffeeShop, Product
+from .serializers import (
+    BannerListSerializer, CategorySerializer, CoffeeShopSerializer, ProductDetailSerializer, ProductListSerializer,
+)
+
+INDEX_VERSION_KEY = "main:index:version"
+INDEX_PAYLOAD_KEY = "main:index:payload:{version}"
+
+INDEX_QUOTE = "Жизнь слишком коротка, чтобы пить плохой кофе ☕️"
+INDEX_FOOTER = {
+    "address": "ул. Примерная, 12",
+    "email": "mochamuse@gmail.com",
+    "phone": "+996 555 123456",
+    "social": {
+        "instagram": "https://instagram.com",
+        "facebook": "https://facebook.com"
+    }
+}
+
+
+def make_etag(data):
+    """Стабильный ETag для уже сериализованных данных."""
+    raw = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)
+    return '"%s"' % md5(raw.encode("utf-8")).hexdigest()
+
+
+def build_index_payload():
+    top_banner = Banner.objects.filter(location="index_head")
+    best_sellers = BestSeller.top_products()
+    coffee_shop = CoffeeShop.objects.first()
+    categories = Category.objects.all()
+    return serialize_index_payload(top_banner, best_sellers, coffee_shop, categories)
+
+
+async def abuild_index_payload():
+    """build_index_payload для async-представлений: независимые запросы идут через asyncio.gather."""
+    top_banner, best_sellers, coffee_shop, categories = await asyncio.gather(
+        _alist(Banner.objects.filter(location="index_head")),
+        BestSeller.atop_products(),
+        CoffeeShop.objects.afirst(),
+        _alist(Category.objects.all()),
+    )
+    return serialize_index_payload(top_banner, best_sellers, coffee_shop, categories)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+def serialize_index_payload(top_banner, best_sellers, coffee_shop, categories):
+    return {
+        "top_banner": BannerListSerializer(top_banner, many=True).data,
+        "best_sellers": ProductListSerializer(best_sellers, many=True).data,
+        "coffee_shop": CoffeeShopSerializer(coffee_shop).data if coffee_shop else None,
+        "quote": INDEX_QUOTE,
+        "categories": CategorySerializer(categories, many=True).data,
+        "footer": INDEX_FOOTER,
+    }
+
+
+def _index_version():
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+
+def get_index_payload():
+    """
+    Возвращает (data, etag) для главной страницы.
+
+    Данные собираются лениво при первом обращении и хранятся в кэше до
+    инвалидации. Ключ содержит версию, поэтому сборка, начатая до
+    инвалидации, не перезапишет свежие данные устаревшими.
+    """
+    version = _index_version()
+    key = INDEX_PAYLOAD_KEY.format(version=version)
+    payload = cache.get(key)
+    if payload is None:
+        data = build_index_payload()
+        payload = {"data": data, "etag": make_etag(data)}
+        cache.set(key, payload, settings.INDEX_CACHE_TIMEOUT)
+    return payload["data"], payload["etag"]
+
+
+async def _aindex_version():
+    version = await cache.aget(INDEX_VERSION_KEY)
+    if version is None:
+        await cache.aadd(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+        version = await cache.aget(INDEX_VERSION_KEY)
+    return version
+
+
+async def aget_index_payload():
+    """get_index_payload для async-представлений; кэш у них общий."""
+    version = await _aindex_version()
+    key = INDEX_PAYLOAD_KEY.format(version=version)
+    payload = await cache.aget(key)
+    if payload is None:
+        data = await abuild_index_payload()
+        payload = {"data": data, "etag": make_etag(data)}
+        await cache.aset(key, payload, settings.INDEX_CACHE_TIMEOUT)
+    return payload["data"], payload["etag"]
+
+
+def invalidate_index_payload():
+    """
+    Меняет версию главной. Внутри транзакции — ещё раз после фиксации:
+    сборка, прочитавшая старые строки до COMMIT, иначе навсегда осталась бы
+    в кэше под новой версией (INDEX_CACHE_TIMEOUT = None).
+    """
+    cache.set(INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: cache.set(INDEX_VERSION_KEY, uuid.uuid4().hex, None))
+
+
+def product_detail_queryset():
+    return Product.objects.select_related("category", "pricing", "stock").prefetch_related("ingredients__ingredient")
+
+
+def build_product_details(product_ids):
+    """
+    {product_id: данные карточки} для существующих товаров. Сериализуются
+    без request, поэтому обложка — относительной ссылкой: абсолютной её
+    делает представление (absolute_cover), и кэш не зависит от хоста.
+    """
+    products = list(product_detail_queryset().filter(pk__in=list(product_ids)))
+    data = ProductDetailSerializer(products, many=True).data
+    return {product.pk: dict(item) for product, item in zip(products, data)}
+
+
+def get_product_detail(product_id):
+    """
+    Данные карточки товара или None, если товара нет. Ключ содержит версию
+    товара из main.invalidation, так что сборка, начатая до инвалидации,
+    ляжет под уже ненужный ключ и свежие данные не перетрёт.
+    """
+    key = product_detail_keys([product_id])[product_id]
+    data = cache.get(key)
+    if data is None:
+        data = _store_product_detail(product_id, key)
+    return data
+
+
+async def aget_product_detail(product_id):
+    """
+    get_product_detail для async-представлений; кэш у них общий. Версия и
+    карточка читаются async API кэша, в поток уходит только сборка карточки
+    при промахе.
+    """
+    key = (await aproduct_detail_keys([product_id]))[product_id]
+    data = await cache.aget(key)
+    if data is None:
+        data = await sync_to_async(_store_product_detail)(product_id, key)
+    return data
+
+
+def _store_product_detail(product_id, key):
+    data = build_product_details([product_id]).get(product_id)
+    if data is None:
+        forget_product_versions([product_id])
+    else:
+        cache.set(key, data, settings.PRODUCT_DETAIL_CACHE_TIMEOUT)
+    return data
+
+
+def warm_product_details(product_ids):
+    """Собирает карточки пачкой (три запроса на пачку) и кладёт их в кэш. Возвращает число карточек."""
+    product_ids = list(product_ids)
+    keys = product_detail_keys(product_ids)
+    details = build_product_details(product_ids)
+    cache.set_many({keys[pk]: data for pk, data in details.items()}, settings.PRODUCT_DETAIL_CACHE_TIMEOUT)
+    forget_product_versions(set(product_ids) - set(details))
+    return len(details)
@@ -0,0 +1,320 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .cache import invalidate_index_payload
+from .invalidation import invalidate_all_product_details
+from .models import Category, Ingredient, Product, ProductIngredient, Stock
+from .pricing import refresh_effective_prices
+from .search import index_documents, reindex_products
+
+# Одна строка фида — один товар; ингредиенты в CSV лежат JSON-списком в ячейке
+CATALOG_FIELDS = [
+    "sku", "title", "category", "description", "price", "new_price", "is_best_seller", "stock", "ingredients",
+]
+
+PRODUCT_UPDATE_FIELDS = ["category", "title", "description", "price", "new_price", "is_best_seller", "updated_at"]
+
+TRUE_VALUES = {"1", "true", "yes", "да"}
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _decimal(value, name):
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"{name}: не число: {value!r}")
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+def parse_row(raw):
+    """
+    Приводит строку фида (CSV — всё строками, JSONL — родные типы) к единому
+    виду. Бросает ValueError с описанием, если строку нельзя импортировать.
+    """
+    sku = str(raw.get("sku") or "").strip()
+    title = str(raw.get("title") or "").strip()
+    category = str(raw.get("category") or "").strip()
+    if not (sku and title and category):
+        raise ValueError("обязательны sku, title и category")
+
+    price = _decimal(raw.get("price"), "price")
+    if price is None:
+        raise ValueError("не указана price")
+
+    stock = raw.get("stock")
+    if stock in (None, ""):
+        stock = None
+    else:
+        try:
+            stock = int(stock)
+        except (TypeError, ValueError):
+            raise ValueError(f"stock: не целое число: {stock!r}")
+        if stock < 0:
+            raise ValueError("stock: отрицательный остаток")
+
+    ingredients = raw.get("ingredients")
+    if isinstance(ingredients, str):
+        ingredients = json.loads(ingredients) if ingredients.strip() else None
+    if ingredients is not None:
+        ingredients = [
+            {
+                "title": str(item["title"]).strip(),
+                "amount": str(item.get("amount") or ""),
+                "is_allergen": None if item.get("is_allergen") is None else _bool(item["is_allergen"]),
+            }
+            for item in ingredients
+        ]
+
+    return {
+        "sku": sku,
+        "title": title,
+        "category": category,
+        "description": str(raw.get("description") or ""),
+        "price": price,
+        "new_price": _decimal(raw.get("new_price"), "new_price"),
+        "is_best_seller": _bool(raw.get("is_best_seller")),
+        "stock": stock,
+        "ingredients": ingredients,
+    }
+
+
+def read_rows(stream, fmt):
+    """Построчно читает фид, не загружая файл целиком. Отдаёт (номер строки, сырой dict)."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for raw in reader:
+            yield reader.line_num, raw
+    else:
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                yield number, json.loads(line)
+
+
+class CatalogImporter:
+    """
+    Импорт каталога пачками. Внешние ключи (категории, ингредиенты)
+    берутся из словарей в памяти, которые загружаются один раз и
+    дополняются по ходу; каждая пачка — одна транзакция из нескольких
+    upsert (bulk_create с update_conflicts) независимо от её размера.
+    """
+
+    def __init__(self):
+        self.categories = dict(Category.objects.values_list("title", "id"))
+        self.ingredients = dict(Ingredient.objects.values_list("title", "id"))
+        self.imported = 0
+        self.errors = []
+
+    def import_rows(self, rows, batch_size=1000):
+        """rows — итерируемое (номер строки, сырой dict). Возвращает число импортированных строк."""
+        for batch in chunked(rows, batch_size):
+            parsed = []
+            for number, raw in batch:
+                try:
+                    parsed.append(parse_row(raw))
+                except (KeyError, TypeError, ValueError) as exc:
+                    self.errors.append((number, str(exc)))
+            if parsed:
+                self.import_batch(parsed)
+        return self.imported
+
+    def import_batch(self, rows):
+        # Повтор артикула внутри пачки: побеждает последняя строка
+        rows = list({row["sku"]: row for row in rows}.values())
+        with transaction.atomic():
+            self._upsert_categories({row["category"] for row in rows})
+            self._upsert_ingredients([item for row in rows for item in row["ingredients"] or []])
+
+            products = Product.objects.bulk_create(
+                [
+                    Product(
+                        sku=row["sku"],
+                        category_id=self.categories[row["category"]],
+                        title=row["title"],
+                        description=row["description"],
+                        price=row["price"],
+                        new_price=row["new_price"],
+                        is_best_seller=row["is_best_seller"],
+                    )
+                    for row in rows
+                ],
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=PRODUCT_UPDATE_FIELDS,
+            )
+            product_ids = {product.sku: product.pk for product in products}
+
+            stocks = [
+                Stock(product_id=product_ids[row["sku"]], quantity=row["stock"])
+                for row in rows if row["stock"] is not None
+            ]
+            if stocks:
+                # Резервы покупателей не трогаем, меняется только количество
+                Stock.objects.bulk_create(
+                    stocks, update_conflicts=True, unique_fields=["product"], update_fields=["quantity", "updated_at"]
+                )
+            unstocked = [Stock(product_id=product_ids[row["sku"]]) for row in rows if row["stock"] is None]
+            if unstocked:
+                # bulk_create товаров не шлёт post_save: строку склада новым товарам заводим здесь
+                Stock.objects.bulk_create(unstocked, ignore_conflicts=True)
+
+            self._replace_links(
+                {product_ids[row["sku"]]: row["ingredients"] for row in rows if row["ingredients"] is not None}
+            )
+
+            # Тексты для поиска уже в памяти; из базы перечитываем только товары,
+            # состав которых фид не передал
+            index_documents({
+                product_ids[row["sku"]]: (
+                    row["title"], row["description"], row["category"],
+                    " ".join(item["title"] for item in row["ingredients"]),
+                )
+                for row in rows if row["ingredients"] is not None
+            })
+            reindex_products([product_ids[row["sku"]] for row in rows if row["ingredients"] is None])
+            refresh_effective_prices(product_ids.values())
+        # Upsert через bulk_create не шлёт post_save: поисковый индекс пачки обновлён
+        # выше, главную (категории, бестселлеры) сбрасываем явно — уже после COMMIT
+        invalidate_index_payload()
+        self.imported += len(rows)
+
+    def _upsert_categories(self, titles):
+        missing = titles - self.categories.keys()
+        if not missing:
+            return
+        created = Category.objects.bulk_create(
+            [Category(title=title) for title in missing],
+            update_conflicts=True,
+            unique_fields=["title"],
+            update_fields=["title"],
+        )
+        self.categories.update((category.title, category.pk) for category in created)
+
+    def _upsert_ingredients(self, items):
+        flagged = {}
+        for item in items:
+            if item["is_allergen"] is not None:
+                flagged[item["title"]] = flagged.get(item["title"], False) or item["is_allergen"]
+        missing = {item["title"] for item in items} - self.ingredients.keys() - flagged.keys()
+
+        if flagged:
+            created = Ingredient.objects.bulk_create(
+                [Ingredient(title=title, is_allergen=is_allergen) for title, is_allergen in flagged.items()],
+                update_conflicts=True,
+                unique_fields=["title"],
+                update_fields=["is_allergen"],
+            )
+            self.ingredients.update((ingredient.title, ingredient.pk) for ingredient in created)
+            # Флаг аллергена виден в карточках всех товаров с ингредиентом, не только
+            # из этой пачки; карточки остальных товаров пачки сбросит refresh_effective_prices
+            invalidate_all_product_details()
+        if missing:
+            created = Ingredient.objects.bulk_create(
+                [Ingredient(title=title) for title in missing],
+                update_conflicts=True,
+                unique_fields=["title"],
+                update_fields=["title"],
+            )
+            self.ingredients.update((ingredient.title, ingredient.pk) for ingredient in created)
+
+    def _replace_links(self, links):
+        """Состав товара из фида заменяет прежний: upsert новых связей и удаление лишних."""
+        if not links:
+            return
+        wanted = {}
+        for product_id, items in links.items():
+            for item in items:
+                wanted[(product_id, self.ingredients[item["title"]])] = item["amount"]
+
+        if wanted:
+            ProductIngredient.objects.bulk_create(
+                [
+                    ProductIngredient(product_id=product_id, ingredient_id=ingredient_id, amount=amount)
+                    for (product_id, ingredient_id), amount in wanted.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["product", "ingredient"],
+                update_fields=["amount"],
+            )
+        stale = [
+            pk
+            for pk, product_id, ingredient_id in ProductIngredient.objects.filter(
+                product_id__in=links
+            ).values_list("id", "product_id", "ingredient_id")
+            if (product_id, ingredient_id) not in wanted
+        ]
+        if stale:
+            ProductIngredient.objects.filter(pk__in=stale).delete()
+
+
+def export_rows(chunk_size=1000):
+    """Строки каталога в формате фида; товары читаются итератором пачками вместе с составом."""
+    products = (
+        Product.objects.select_related("category", "stock")
+        .prefetch_related("ingredients__ingredient")
+        .order_by("id")
+    )
+    for product in products.iterator(chunk_size=chunk_size):
+        try:
+            stock = product.stock.quantity
+        except ObjectDoesNotExist:
+            stock = None
+        yield {
+            "sku": product.sku or "",
+            "title": product.title,
+            "category": product.category.title,
+            "description": product.description,
+            "price": product.price,
+            "new_price": product.new_price,
+            "is_best_seller": product.is_best_seller,
+            "stock": stock,
+            "ingredients": [
+                {"title": link.ingredient.title, "amount": link.amount, "is_allergen": link.ingredient.is_allergen}
+                for link in product.ingredients.all()
+            ],
+        }
+
+
+def write_rows(stream, rows, fmt):
+    """Пишет строки в поток по одной. Возвращает их число."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=CATALOG_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                **row,
+                "new_price": "" if row["new_price"] is None else row["new_price"],
+                "is_best_seller": int(row["is_best_seller"]),
+                "stock": "" if row["stock"] is None else row["stock"],
+                "ingredients": json.dumps(row["ingredients"], ensure_ascii=False),
+            })
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+            count += 1
+    return count
@@ -0,0 +1,67 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def not_modified(request, etag, last_modified):
+    """Ответ 304 (или 412), если клиентская копия актуальна, иначе None."""
+    if not etag:
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def add_validator_headers(response, etag, last_modified, max_age):
+    if etag and response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(int(last_modified.timestamp()))
+        patch_cache_control(response, public=True, max_age=max_age)
+        patch_vary_headers(response, ["Accept"])
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag, Last-Modified и Cache-Control для GET каталога. Валидаторы
+    считаются одним агрегатом MAX(updated_at) и COUNT(*) по queryset
+    представления, без сериализации, поэтому на If-None-Match и
+    If-Modified-Since ответ 304 уходит до того, как собирается тело.
+
+    validator_fields — поля updated_at, от которых зависит ответ, включая
+    связанные (category__updated_at): изменение категории меняет и
+    вложенные в товары данные.
+    """
+    validator_fields = ("updated_at",)
+    cache_max_age = None  # None — settings.CATALOG_CACHE_MAX_AGE
+
+    def get_validator_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def get_validators(self):
+        """(etag, last_modified) или (None, None), если проверять нечего."""
+        aggregates = {f"field_{number}": Max(name) for number, name in enumerate(self.validator_fields)}
+        row = self.get_validator_queryset().order_by().aggregate(count=Count("pk"), **aggregates)
+        if not row["count"]:
+            return None, None
+        stamps = [row[f"field_{number}"] for number in range(len(self.validator_fields))]
+        # Формат ответа тоже часть ETag: JSON и browsable API по одному адресу
+        raw = "|".join([self.request.accepted_renderer.format, str(row["count"])] + [
+            stamp.isoformat() if stamp else "-" for stamp in stamps
+        ])
+        last_modified = max((stamp for stamp in stamps if stamp), default=None)
+        return '"%s"' % md5(raw.encode()).hexdigest(), last_modified
+
+    def get_cache_max_age(self):
+        return settings.CATALOG_CACHE_MAX_AGE if self.cache_max_age is None else self.cache_max_age
+
+    def get(self, request, *args, **kwargs):
+        # Те же шаги повторяют async-представления (main.async_views)
+        etag, last_modified = self.get_validators()
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return add_validator_headers(response, etag, last_modified, self.get_cache_max_age())
@@ -0,0 +1,13 @@
+def pragma_statements(pragmas):
+    """PRAGMA-команды из словаря настроек SQLITE_PRAGMAS, в порядке словаря."""
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+
+def apply_pragmas(cursor, pragmas):
+    """
+    Применяет PRAGMA к соединению. journal_mode=wal сохраняется в самом файле
+    базы, остальные действуют только на это соединение, поэтому их нужно
+    выставлять при каждом подключении.
+    """
+    for statement in pragma_statements(pragmas):
+        cursor.execute(statement)
@@ -0,0 +1,129 @@
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+# В CSV одна строка на позицию заказа, поля заказа повторяются
+ORDER_EXPORT_FIELDS = [
+    "order_id", "created_at", "user_email", "status", "payment_method", "transaction_id", "total_price",
+    "product_id", "title", "quantity", "price", "discount", "line_total",
+]
+
+# Данные карты и коды подтверждения в выгрузку не попадают
+ORDER_COLUMNS = ["id", "created_at", "status", "payment_method", "transaction_id", "total_price", "user__email"]
+
+
+def parse_bound(value, end=False):
+    """
+    Граница периода: дата (YYYY-MM-DD) или дата-время ISO 8601. Бросает
+    ValueError, если значение не разобрать.
+
+    Конец периода (end=True) включается и возвращается исключающей границей
+    для created_at__lt: дата — началом следующего дня, дата-время —
+    следующей микросекундой (точность datetime), так что сам момент в
+    период попадает.
+    """
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.datetime.combine(day + datetime.timedelta(days=1) if end else day, datetime.time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f"Неверная дата: {value!r}")
+        if end:
+            moment += datetime.timedelta(microseconds=1)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_orders_queryset(start=None, end=None):
+    orders = Order.objects.select_related("user").only(*ORDER_COLUMNS).prefetch_related("items")
+    if start:
+        orders = orders.filter(created_at__gte=start)
+    if end:
+        orders = orders.filter(created_at__lt=end)
+    return orders.order_by("created_at", "id")
+
+
+def iter_orders(start=None, end=None, chunk_size=2000):
+    """Заказы периода итератором: на каждую пачку — один запрос заказов и один запрос позиций."""
+    return export_orders_queryset(start, end).iterator(chunk_size=chunk_size)
+
+
+def order_record(order):
+    return {
+        "order_id": order.pk,
+        "created_at": order.created_at,
+        "user_email": order.user.email,
+        "status": order.status,
+        "payment_method": order.payment_method,
+        "transaction_id": order.transaction_id,
+        "total_price": order.total_price,
+        "items": [
+            {
+                "product_id": item.product_id,
+                "title": item.title,
+                "quantity": item.quantity,
+                "price": item.price,
+                "discount": item.discount,
+                "line_total": item.line_total,
+            }
+            for item in order.items.all()
+        ],
+    }
+
+
+def buffered(lines, size=64 * 1024):
+    """Склеивает мелкие строки в блоки ~size символов, чтобы не отдавать по строке за раз."""
+    block = []
+    length = 0
+    for line in lines:
+        block.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(block)
+            block = []
+            length = 0
+    if block:
+        yield "".join(block)
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: write возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def stream_orders(orders, fmt):
+    """
+    Генератор строк выгрузки; по нему можно писать в файл или отдавать
+    StreamingHttpResponse — в памяти держится только текущая пачка заказов.
+    """
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(ORDER_EXPORT_FIELDS)
+        for order in orders:
+            record = order_record(order)
+            record["created_at"] = record["created_at"].isoformat()
+            head = [record[name] for name in ORDER_EXPORT_FIELDS[:7]]
+            if not record["items"]:
+                yield writer.writerow(head)
+            for item in record["items"]:
+                yield writer.writerow(head + [item[name] for name in ORDER_EXPORT_FIELDS[7:]])
+    else:
+        for order in orders:
+            yield json.dumps(order_record(order), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
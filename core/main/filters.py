@@ -1,9 +1,21 @@
 import django_filters
 from .models import Product
+from .search import MAX_RESULTS, search_products
 
 class ProductFilter(django_filters.FilterSet):
-    search = django_filters.CharFilter(field_name="title", lookup_expr="icontains")
+    search = django_filters.CharFilter(
+        method="filter_search",
+        help_text=(
+            "Поиск по названию, описанию, категории и ингредиентам. В выдаче не больше "
+            f"{MAX_RESULTS} самых релевантных товаров: дальше курсор не листает."
+        ),
+    )
+    min_rating = django_filters.NumberFilter(field_name="rating", lookup_expr="gte")
+    min_reviews = django_filters.NumberFilter(field_name="review_count", lookup_expr="gte")
 
     class Meta:
         model = Product
-        fields = ["category", "search"]
+        fields = ["category", "search", "min_rating", "min_reviews"]
+
+    def filter_search(self, queryset, name, value):
+        return search_products(queryset, value)
@@ -0,0 +1,170 @@
+"""
+Версии кэша карточек товаров (main.cache.get_product_detail) и карта
+зависимостей: какие карточки устаревают при изменении связанных моделей.
+Здесь нет импорта сериализаторов, поэтому модуль можно звать из stock и
+pricing без циклических импортов.
+"""
+import datetime
+import time
+import uuid
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Category, Ingredient, Product, ProductIngredient, Stock
+
+PRODUCT_GENERATION_KEY = "main:product:generation"
+PRODUCT_VERSION_KEY = "main:product:{pk}:version"
+PRODUCT_DETAIL_KEY = "main:product:{pk}:detail:{generation}:{version}"
+
+# Модель -> товары, карточки которых зависят от экземпляра.
+# Цены и акции идут через main.pricing.refresh_effective_prices,
+# остатки при резервах — через main.stock, отзывы — в сигналах отзывов.
+DEPENDENCIES = {
+    Product: lambda product: [product.pk],
+    Category: lambda category: category.products.values_list("pk", flat=True),
+    Ingredient: lambda ingredient: (
+        ProductIngredient.objects.filter(ingredient=ingredient).values_list("product_id", flat=True)
+    ),
+    ProductIngredient: lambda link: [link.product_id],
+    Stock: lambda stock: [stock.product_id],
+}
+
+
+def _new_version():
+    # Время смены версии служит Last-Modified карточки, uuid — уникальностью
+    return f"{time.time():.6f}-{uuid.uuid4().hex}"
+
+
+def _version_time(version):
+    try:
+        return datetime.datetime.fromtimestamp(float(version.partition("-")[0]), tz=datetime.timezone.utc)
+    except ValueError:
+        return None
+
+
+def _version_keys(product_ids):
+    return {pk: PRODUCT_VERSION_KEY.format(pk=pk) for pk in product_ids}
+
+
+def _current_versions(product_ids):
+    """(generation, {product_id: version}); недостающие версии заводятся."""
+    version_keys = _version_keys(product_ids)
+    found = cache.get_many([PRODUCT_GENERATION_KEY, *version_keys.values()])
+
+    missing = [key for key in [PRODUCT_GENERATION_KEY, *version_keys.values()] if key not in found]
+    if missing:
+        # add не перезапишет версию, которую параллельно успел завести другой процесс
+        for key in missing:
+            cache.add(key, _new_version(), _timeout(key))
+        found.update(cache.get_many(missing))
+
+    return found[PRODUCT_GENERATION_KEY], {pk: found[key] for pk, key in version_keys.items()}
+
+
+async def _acurrent_versions(product_ids):
+    """_current_versions через async API кэша."""
+    version_keys = _version_keys(product_ids)
+    found = await cache.aget_many([PRODUCT_GENERATION_KEY, *version_keys.values()])
+
+    missing = [key for key in [PRODUCT_GENERATION_KEY, *version_keys.values()] if key not in found]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, _new_version(), _timeout(key))
+        found.update(await cache.aget_many(missing))
+
+    return found[PRODUCT_GENERATION_KEY], {pk: found[key] for pk, key in version_keys.items()}
+
+
+def _timeout(key):
+    # Поколение одно на весь каталог; версии товаров живут не дольше карточек,
+    # иначе каждый id из адреса оставлял бы в кэше вечный ключ
+    return None if key == PRODUCT_GENERATION_KEY else settings.PRODUCT_DETAIL_CACHE_TIMEOUT
+
+
+def product_detail_keys(product_ids):
+    """
+    {product_id: ключ карточки} для текущих версий. Недостающие версии
+    заводятся, поэтому звать до чтения товаров из базы, а для тех, что не
+    нашлись, — forget_product_versions.
+    """
+    return _detail_keys(*_current_versions(list(product_ids)))
+
+
+async def aproduct_detail_keys(product_ids):
+    return _detail_keys(*await _acurrent_versions(list(product_ids)))
+
+
+def _detail_keys(generation, versions):
+    return {
+        pk: PRODUCT_DETAIL_KEY.format(pk=pk, generation=generation, version=version)
+        for pk, version in versions.items()
+    }
+
+
+def forget_product_versions(product_ids):
+    # Без версии карточка просто соберётся заново, так что удалять её безопасно
+    cache.delete_many(list(_version_keys(product_ids).values()))
+
+
+def product_detail_validators(product_id, fmt):
+    """
+    (etag, last_modified) карточки товара по её версии в кэше, без запросов
+    к базе. Версия меняется при изменении любой зависимости из DEPENDENCIES,
+    включая состав и флаги аллергенов, поэтому ETag устаревает вместе с
+    кэшем карточки; Last-Modified — время последней смены версии.
+
+    Версию заводят изменения товара и сборка его карточки, но не запрос к
+    несуществующему id: пока версии нет, валидаторов тоже нет — (None, None),
+    и ответ решает сама карточка (200 или 404).
+    """
+    version = cache.get(PRODUCT_VERSION_KEY.format(pk=product_id))
+    if version is None:
+        return None, None
+    return _validators(fmt, _current_versions([])[0], version)
+
+
+async def aproduct_detail_validators(product_id, fmt):
+    version = await cache.aget(PRODUCT_VERSION_KEY.format(pk=product_id))
+    if version is None:
+        return None, None
+    return _validators(fmt, (await _acurrent_versions([]))[0], version)
+
+
+def _validators(fmt, generation, version):
+    etag = '"%s"' % md5("|".join([fmt, generation, version]).encode()).hexdigest()
+    stamps = [stamp for stamp in (_version_time(generation), _version_time(version)) if stamp]
+    return etag, max(stamps, default=None)
+
+
+def _bump(product_ids):
+    cache.set_many(
+        {PRODUCT_VERSION_KEY.format(pk=pk): _new_version() for pk in product_ids},
+        settings.PRODUCT_DETAIL_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_product_details(product_ids):
+    """
+    Делает карточки товаров устаревшими. Внутри транзакции версия ещё раз
+    меняется после фиксации: пересборка, успевшая прочитать старые данные до
+    COMMIT, иначе осталась бы в кэше под новой версией.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    _bump(product_ids)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(product_ids))
+
+
+def invalidate_all_product_details():
+    cache.set(PRODUCT_GENERATION_KEY, _new_version(), None)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: cache.set(PRODUCT_GENERATION_KEY, _new_version(), None))
+
+
+def invalidate_dependents(instance):
+    invalidate_product_details(DEPENDENCIES[type(instance)](instance))
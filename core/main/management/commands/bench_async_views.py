@@ -0,0 +1,103 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from main.models import Product
+
+# Эндпоинт -> (синхронный DRF, async-версия)
+ENDPOINTS = {
+    "index": ("index", "async_index"),
+    "products": ("product_list", "async_product_list"),
+    "detail": ("product_detail", "async_product_detail"),
+}
+
+
+def summary(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    return (
+        f"{name:>6}: {len(latencies) / elapsed:7.0f} запросов/с, "
+        f"p50 {statistics.median(latencies) * 1000:6.1f} мс, p95 {p95 * 1000:6.1f} мс"
+    )
+
+
+def run_wsgi(path, requests, threads, client_delay):
+    """Синхронное представление через WSGI-обработчик; threads — потоки воркера."""
+    local = threading.local()
+
+    def call(_):
+        if not hasattr(local, "client"):
+            local.client = Client()
+        started = time.perf_counter()
+        response = local.client.get(path)
+        # Медленный клиент: поток воркера занят, пока ответ уходит по сети
+        time.sleep(client_delay)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(call, range(requests)))
+    return latencies, time.perf_counter() - started
+
+
+async def run_asgi(path, requests, concurrency, client_delay):
+    """async-представление через ASGI-обработчик; concurrency — одновременных клиентов."""
+    client = AsyncClient()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call():
+        async with slots:
+            started = time.perf_counter()
+            response = await client.get(path)
+            # Пока ответ уходит медленному клиенту, цикл событий обслуживает остальных
+            await asyncio.sleep(client_delay)
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(call() for _ in range(requests)))
+    return latencies, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочное сравнение каталога: синхронные DRF-представления под WSGI с пулом потоков "
+        "против async-представлений под ASGI. Медленные клиенты моделируются задержкой --client-delay"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), action="append")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=4, help="Потоков WSGI-воркера")
+        parser.add_argument("--concurrency", type=int, default=100, help="Одновременных клиентов под ASGI")
+        parser.add_argument("--client-delay", type=int, default=50, help="Задержка отдачи ответа клиенту, мс")
+
+    def handle(self, *args, **options):
+        product_id = Product.objects.values_list("pk", flat=True).first()
+        if product_id is None:
+            raise CommandError("В каталоге нет товаров")
+        delay = options["client_delay"] / 1000
+
+        self.stdout.write(
+            f"Запросов: {options['requests']}, потоков WSGI: {options['threads']}, "
+            f"клиентов ASGI: {options['concurrency']}, задержка клиента: {options['client_delay']} мс"
+        )
+        for endpoint in options["endpoint"] or sorted(ENDPOINTS):
+            sync_name, async_name = ENDPOINTS[endpoint]
+            kwargs = {"pk": product_id} if endpoint == "detail" else {}
+            sync_path, async_path = reverse(sync_name, kwargs=kwargs), reverse(async_name, kwargs=kwargs)
+            # Прогрев: кэш главной и первые соединения
+            Client().get(sync_path)
+
+            self.stdout.write(f"{endpoint}:")
+            latencies, elapsed = run_wsgi(sync_path, options["requests"], options["threads"], delay)
+            self.stdout.write("  " + summary("wsgi", latencies, elapsed))
+            latencies, elapsed = asyncio.run(run_asgi(async_path, options["requests"], options["concurrency"], delay))
+            self.stdout.write("  " + summary("asgi", latencies, elapsed))
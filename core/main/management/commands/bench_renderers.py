@@ -0,0 +1,67 @@
+import datetime
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from main import renderers
+from main.models import Order, OrderItems
+from main.serializers import OrderNestedSerializer
+
+
+def sample_orders(count, items_per_order):
+    """Несохранённые заказы с позициями — как после prefetch_related("items") в OrderListAPIView."""
+    now = timezone.now()
+    orders = []
+    for pk in range(1, count + 1):
+        order = Order(
+            pk=pk,
+            total_price=Decimal("1290.00") + pk,
+            status=Order.STATUS_CHOICES[pk % len(Order.STATUS_CHOICES)][0],
+            created_at=now - datetime.timedelta(minutes=pk, microseconds=pk),
+        )
+        order._prefetched_objects_cache = {
+            "items": [
+                OrderItems(
+                    pk=pk * items_per_order + number, order=order, product_id=number + 1,
+                    quantity=number + 1, line_total=Decimal("215.50") * (number + 1),
+                )
+                for number in range(items_per_order)
+            ]
+        }
+        orders.append(order)
+    return orders
+
+
+def renders_per_second(renderer, payload, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        renderer.render(payload)
+    return repeat / (time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = "Микробенчмарк рендеринга страниц OrderNestedSerializer: JSONRenderer DRF против main.renderers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100, help="Заказов на странице")
+        parser.add_argument("--items", type=int, default=4, help="Позиций в заказе")
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        payload = OrderNestedSerializer(sample_orders(options["orders"], options["items"]), many=True).data
+        baseline, fast = JSONRenderer(), renderers.FastJSONRenderer()
+        output = fast.render(payload)
+
+        self.stdout.write(
+            f"orjson: {'да' if renderers.orjson else 'нет'}, страница {len(output) / 1024:.0f} КиБ, "
+            f"вывод совпадает с DRF: {'да' if output == baseline.render(payload) else 'нет'}"
+        )
+        for name, renderer in (("json", baseline), ("fast", fast)):
+            rate = renders_per_second(renderer, payload, options["repeat"])
+            self.stdout.write(
+                f"{name:>6}: {rate:8.0f} страниц/с, {rate * options['orders']:10.0f} заказов/с, "
+                f"{rate * len(output) / 2 ** 20:7.1f} МиБ/с"
+            )
@@ -0,0 +1,56 @@
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from main.models import Order, Product
+from main.serializers import OrderNestedSerializer, ProductListSerializer
+
+# Эндпоинт -> (сериализатор, queryset как во view)
+TARGETS = {
+    "products": (ProductListSerializer, lambda: Product.objects.select_related("category", "pricing")),
+    "orders": (OrderNestedSerializer, lambda: Order.objects.prefetch_related("items")),
+}
+
+
+def rows_per_second(make_serializer, rows, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        make_serializer(rows).data
+    return len(rows) * repeat / (time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = (
+        "Строк в секунду при сериализации списков товаров и заказов: обычный ListSerializer DRF "
+        "против списков по готовому плану полей (main.plans)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500, help="Строк в списке; строки базы повторяются до этого числа")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get("/api/"))
+        context = {"request": request}
+
+        for name, (serializer_class, queryset) in TARGETS.items():
+            loaded = list(queryset()[:options["rows"]])
+            if not loaded:
+                raise CommandError(f"Нет данных для {name}")
+            rows = list(itertools.islice(itertools.cycle(loaded), options["rows"]))
+
+            before = rows_per_second(
+                lambda items: serializers.ListSerializer(items, child=serializer_class(context=context), context=context),
+                rows, options["repeat"],
+            )
+            after = rows_per_second(
+                lambda items: serializer_class(items, many=True, context=context),
+                rows, options["repeat"],
+            )
+            self.stdout.write(
+                f"{name:>8}: до {before:9.0f} строк/с, после {after:9.0f} строк/с, ускорение {after / before:.1f}x"
+            )
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.db import apply_pragmas
+
+# Настройки SQLite по умолчанию (как было до SQLITE_PRAGMAS): журнал delete, synchronous=full
+DEFAULT_PRAGMAS = {"journal_mode": "delete", "synchronous": "full"}
+
+PROFILES = {
+    # Новое соединение на запрос, BEGIN DEFERRED, настройки по умолчанию
+    "before": {"pragmas": DEFAULT_PRAGMAS, "begin": "BEGIN", "persistent": False},
+    # Постоянное соединение, BEGIN IMMEDIATE, SQLITE_PRAGMAS из настроек
+    "after": {"pragmas": None, "begin": "BEGIN IMMEDIATE", "persistent": True},
+}
+
+
+def _connect(path, pragmas):
+    # timeout=5 — значение по умолчанию у sqlite3 и Django
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    apply_pragmas(conn.cursor(), pragmas)
+    return conn
+
+
+def _prepare(path, products):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = delete")
+    conn.execute("CREATE TABLE stock (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL)")
+    conn.execute("CREATE TABLE sale (id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL, created REAL NOT NULL)")
+    conn.executemany("INSERT INTO stock (id, quantity) VALUES (?, ?)", [(pk, 10 ** 9) for pk in range(products)])
+    conn.close()
+
+
+def run_profile(path, profile, threads, transactions, products):
+    """
+    threads потоков по transactions транзакций «прочитать остаток — списать —
+    записать продажу», как при оформлении заказа. Возвращает
+    (успешных, ошибок «database is locked», секунд).
+    """
+    pragmas = profile["pragmas"] if profile["pragmas"] is not None else settings.SQLITE_PRAGMAS
+    committed = []
+    failed = []
+
+    def worker(number):
+        ok = errors = 0
+        conn = _connect(path, pragmas) if profile["persistent"] else None
+        for i in range(transactions):
+            current = conn or _connect(path, pragmas)
+            product_id = (number * transactions + i) % products
+            try:
+                current.execute(profile["begin"])
+                current.execute("SELECT quantity FROM stock WHERE id = ?", (product_id,)).fetchone()
+                current.execute("UPDATE stock SET quantity = quantity - 1 WHERE id = ?", (product_id,))
+                current.execute("INSERT INTO sale (product_id, created) VALUES (?, ?)", (product_id, time.time()))
+                current.execute("COMMIT")
+                ok += 1
+            except sqlite3.OperationalError:
+                if current.in_transaction:
+                    current.execute("ROLLBACK")
+                errors += 1
+            finally:
+                if conn is None:
+                    current.close()
+        if conn is not None:
+            conn.close()
+        committed.append(ok)
+        failed.append(errors)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(committed), sum(failed), time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность записи SQLite до и после настройки: "
+        "WAL и PRAGMA, BEGIN IMMEDIATE, постоянные соединения. Работает на временном файле"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--transactions", type=int, default=200, help="Транзакций на поток")
+        parser.add_argument("--products", type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Потоков: {options['threads']}, транзакций на поток: {options['transactions']}, "
+            f"товаров: {options['products']}"
+        )
+        for name, profile in PROFILES.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.sqlite3")
+                _prepare(path, options["products"])
+                ok, errors, elapsed = run_profile(
+                    path, profile, options["threads"], options["transactions"], options["products"]
+                )
+            self.stdout.write(
+                f"{name:>6}: успешно {ok}, ошибок блокировки {errors}, {elapsed:.2f} с, {ok / elapsed:.0f} транзакций/с"
+            )
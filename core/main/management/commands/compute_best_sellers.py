@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.bestsellers import DEFAULT_TOP, DEFAULT_WINDOW_DAYS, advance_window, materialize
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает бестселлеры по продажам за скользящее окно дней (запускать раз в сутки "
+        "после полуночи): окно сдвигается на новые дни, рейтинг записывается в таблицу BestSeller"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS)
+        parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="Сколько товаров в рейтинге и в каждой категории")
+        parser.add_argument("--rebuild", action="store_true", help="Посчитать окно заново, а не сдвигать")
+
+    def handle(self, *args, **options):
+        # Последний полный день: сегодняшние продажи попадут в окно завтра
+        end = timezone.localdate() - datetime.timedelta(days=1)
+        advance_window(end, options["window_days"], rebuild=options["rebuild"])
+        rows = materialize(options["top"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Окно по {end:%d.%m.%Y} ({options['window_days']} дн.), записано мест в рейтинге: {len(rows)}"
+        ))
@@ -0,0 +1,104 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIClient
+
+from main.models import Category
+from user.models import User
+
+# Запросы с фильтрами, которых нет в самих маршрутах; {category} — id существующей категории
+EXTRA_PATHS = [
+    "/api/products/?category={category}",
+    "/api/products/?category={category}&ordering=title",
+    "/api/products/?search=кофе",
+    "/api/products/best-sellers/?category={category}",
+    "/api/analytics/sales/?group_by=product",
+]
+
+
+def iter_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def get_paths(prefix, sample_id):
+    """Пути всех именованных GET-маршрутов под prefix; параметры пути подставляются sample_id."""
+    paths = []
+    for pattern in iter_patterns(get_resolver().url_patterns):
+        view_class = getattr(pattern.callback, "view_class", None) or getattr(pattern.callback, "cls", None)
+        if not pattern.name or view_class is None or not hasattr(view_class, "get"):
+            continue
+        kwargs = {name: sample_id for name in pattern.pattern.converters}
+        path = reverse(pattern.name, kwargs=kwargs)
+        if path.startswith(prefix):
+            paths.append(path)
+    return paths
+
+
+def explain(sql):
+    """Строки плана запроса и те из них, что означают полный проход по таблице."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[-1] for row in cursor.fetchall()]
+            flagged = [line for line in plan if line.startswith("SCAN ") and " INDEX " not in line]
+        else:
+            cursor.execute(f"EXPLAIN {sql}")
+            plan = [row[0] for row in cursor.fetchall()]
+            flagged = [line.strip() for line in plan if "Seq Scan" in line]
+    return plan, flagged
+
+
+class Command(BaseCommand):
+    help = (
+        "Вызывает все GET-эндпоинты API в откатываемой транзакции и прогоняет их запросы через "
+        "EXPLAIN (SQLite — EXPLAIN QUERY PLAN), отмечая полные проходы по таблицам"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="/api/", help="Проверять только пути с этим префиксом")
+        parser.add_argument("--id", type=int, default=1, help="Что подставлять в параметры пути вроде <int:pk>")
+        parser.add_argument("--verbose-plan", action="store_true", help="Печатать планы всех запросов")
+        parser.add_argument("--strict", action="store_true", help="Завершиться с ошибкой, если есть полные проходы")
+
+    def handle(self, *args, **options):
+        category = Category.objects.values_list("pk", flat=True).first() or options["id"]
+        paths = get_paths(options["prefix"], options["id"]) + [path.format(category=category) for path in EXTRA_PATHS]
+        flagged_total = 0
+
+        # Всё, что эндпоинты могли записать (и временный сотрудник), откатывается
+        with transaction.atomic():
+            staff = User.objects.create_user(email="explain-queries@example.invalid", username="explain", is_admin=True)
+            client = APIClient()
+            client.force_authenticate(staff)
+
+            for path in paths:
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get(path)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                status = response.status_code
+                selects = [query["sql"] for query in captured.captured_queries if query["sql"].startswith("SELECT")]
+                self.stdout.write(f"GET {path} -> {status}, запросов: {len(selects)}")
+
+                for sql in selects:
+                    plan, flagged = explain(sql)
+                    if flagged:
+                        flagged_total += len(flagged)
+                        # Проход с LIMIT по индексному порядку останавливается рано — это стоит проверить глазами
+                        hint = " (с LIMIT)" if " LIMIT " in sql else ""
+                        self.stdout.write(self.style.WARNING(f"  ПОЛНЫЙ ПРОХОД{hint}: {'; '.join(flagged)}"))
+                        self.stdout.write(f"    {sql[:300]}")
+                    elif options["verbose_plan"]:
+                        self.stdout.write(f"  {'; '.join(plan)}")
+
+            transaction.set_rollback(True)
+
+        summary = f"Проверено эндпоинтов: {len(paths)}, полных проходов: {flagged_total}"
+        if flagged_total and options["strict"]:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
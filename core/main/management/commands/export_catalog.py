@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.catalog import detect_format, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = "Выгружает каталог в CSV или JSONL в формате фида import_catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл выгрузки или - для stdout")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="По умолчанию — по расширению файла")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = detect_format(path, options["format"])
+        stream = self.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+
+        started = time.monotonic()
+        try:
+            count = write_rows(stream, export_rows(options["chunk_size"]), fmt)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+
+        rate = count / elapsed if elapsed else 0
+        self.stderr.write(f"Выгружено товаров: {count}, {elapsed:.2f} с ({rate:.0f} строк/с)")
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.exports import EXPORT_FORMATS, iter_orders, parse_bound, stream_orders
+
+
+class Command(BaseCommand):
+    help = "Выгружает заказы с позициями за период в CSV или JSONL потоково, не загружая всё в память"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл выгрузки или - для stdout")
+        parser.add_argument("--from", dest="start", help="Начало периода: YYYY-MM-DD или ISO 8601")
+        parser.add_argument("--to", dest="end", help="Конец периода включительно: YYYY-MM-DD или ISO 8601")
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), help="По умолчанию — по расширению файла")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_bound(options["start"])
+            end = parse_bound(options["end"], end=True)
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        stream = self.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+
+        started = time.monotonic()
+        lines = 0
+        try:
+            for line in stream_orders(iter_orders(start, end, options["chunk_size"]), fmt):
+                stream.write(line)
+                lines += 1
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+
+        self.stderr.write(f"Записано строк: {lines}, {elapsed:.2f} с ({lines / elapsed if elapsed else 0:.0f} строк/с)")
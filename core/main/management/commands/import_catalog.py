@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.catalog import CatalogImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Импортирует каталог (категории, товары, ингредиенты, остатки) из CSV или JSONL пачками upsert"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл фида или - для stdin")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="По умолчанию — по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = detect_format(path, options["format"])
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+
+        importer = CatalogImporter()
+        started = time.monotonic()
+        try:
+            importer.import_rows(read_rows(stream, fmt), options["batch_size"])
+        except ValueError as exc:
+            raise CommandError(f"Не удалось прочитать фид: {exc}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.monotonic() - started
+
+        for number, error in importer.errors[:20]:
+            self.stderr.write(f"Строка {number}: {error}")
+        if len(importer.errors) > 20:
+            self.stderr.write(f"... и ещё {len(importer.errors) - 20} ошибок")
+
+        rate = importer.imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано товаров: {importer.imported}, пропущено строк: {len(importer.errors)}, "
+            f"{elapsed:.2f} с ({rate:.0f} строк/с)"
+        ))
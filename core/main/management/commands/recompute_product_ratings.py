@@ -0,0 +1,36 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from main.invalidation import invalidate_product_details
+from main.models import Product, Review
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает количество отзывов и средний рейтинг всех товаров по таблице отзывов"
+
+    def handle(self, *args, **options):
+        stats = {
+            row["product"]: (row["count"], row["total"])
+            for row in Review.objects.values("product").annotate(count=Count("id"), total=Sum("rating"))
+        }
+
+        changed = []
+        now = timezone.now()
+        for product in Product.objects.only("id", "rating", "review_count", "rating_sum").iterator(chunk_size=2000):
+            count, total = stats.get(product.pk, (0, 0))
+            if count:
+                rating = (Decimal(total) / count).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+            else:
+                # Ручной рейтинг товара без отзывов не трогаем, пока отзывов не было вовсе
+                rating = product.rating if not product.review_count else Decimal("0.0")
+            if (product.review_count, product.rating_sum, product.rating) != (count, total, rating):
+                product.review_count, product.rating_sum, product.rating = count, total, rating
+                product.updated_at = now
+                changed.append(product)
+
+        Product.objects.bulk_update(changed, ["review_count", "rating_sum", "rating", "updated_at"], batch_size=500)
+        invalidate_product_details(product.pk for product in changed)
+        self.stdout.write(self.style.SUCCESS(f"Обновлено товаров: {len(changed)}"))
@@ -0,0 +1,36 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from main.models import Basket
+from main.pricing import price_expression
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает суммы корзин, разошедшиеся с позициями (например, после смены цен)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Только показать расхождения")
+
+    def handle(self, *args, **options):
+        actual_total = Coalesce(
+            Sum(F("items__quantity") * price_expression("items__product__"), output_field=DecimalField()),
+            Value(Decimal("0.00")),
+            output_field=DecimalField(),
+        )
+        # Один агрегирующий запрос: в Python попадают только разошедшиеся корзины
+        drifted = []
+        for basket in Basket.objects.annotate(actual_total=actual_total).exclude(total_price=F("actual_total")):
+            actual = Decimal(basket.actual_total).quantize(Decimal("0.01"))
+            if basket.total_price != actual:
+                basket.total_price = actual
+                drifted.append(basket)
+
+        if options["dry_run"]:
+            self.stdout.write(f"Найдено расхождений: {len(drifted)}")
+            return
+
+        Basket.objects.bulk_update(drifted, ["total_price"], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"Исправлено корзин: {len(drifted)}"))
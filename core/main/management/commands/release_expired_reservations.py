@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.stock import release_expired
+
+
+class Command(BaseCommand):
+    help = "Возвращает на склад истёкшие резервы товаров из корзин (запускать по cron раз в минуту)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Снято резервов: {released}"))
@@ -0,0 +1,48 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from main.scheduler import PromotionScheduler, recently_switched_promotions, refresh_promotion_products
+
+
+class Command(BaseCommand):
+    help = "Воркер: включает и выключает акции на границах их дат, пересчитывая цены только затронутых товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rescan-interval", type=int, default=3600,
+            help="Как часто (сек) перечитывать список акций, чтобы подхватить новые и изменённые",
+        )
+        parser.add_argument(
+            "--catch-up-days", type=int, default=1,
+            help="При старте пересчитать акции, переключившиеся за столько последних дней",
+        )
+        parser.add_argument("--once", action="store_true", help="Только догоняющий пересчёт, без ожидания")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        switched = recently_switched_promotions(timezone.localtime(now).date(), options["catch_up_days"])
+        if switched:
+            count = refresh_promotion_products(switched)
+            self.stdout.write(f"Догоняющий пересчёт: акций {len(switched)}, товаров {count}")
+        if options["once"]:
+            return
+
+        scheduler = PromotionScheduler()
+        next_rescan = now
+        while True:
+            now = timezone.now()
+            if now >= next_rescan:
+                scheduler.load(now)
+                next_rescan = now + datetime.timedelta(seconds=options["rescan_interval"])
+
+            count = scheduler.run_due(now)
+            if count:
+                self.stdout.write(f"{timezone.localtime(now):%Y-%m-%d %H:%M}: пересчитано товаров {count}")
+
+            wake_at = min(filter(None, [scheduler.next_boundary(), next_rescan]))
+            close_old_connections()
+            time.sleep(max((wake_at - timezone.now()).total_seconds(), 1))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from main.cache import warm_product_details
+from main.catalog import chunked
+from main.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Заранее собирает кэш карточек товаров (запускать при деплое, после migrate): "
+        "первые покупатели не ждут сборки карточек"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Товаров на пачку; на пачку — три запроса")
+        parser.add_argument("--ids", type=int, nargs="+", help="Только эти товары")
+
+    def handle(self, *args, **options):
+        products = Product.objects.order_by("pk").values_list("pk", flat=True)
+        if options["ids"]:
+            products = products.filter(pk__in=options["ids"])
+
+        warmed = 0
+        for product_ids in chunked(products.iterator(chunk_size=options["chunk_size"]), options["chunk_size"]):
+            warmed += warm_product_details(product_ids)
+        self.stdout.write(self.style.SUCCESS(f"В кэше карточек товаров: {warmed}"))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+def backfill_price_snapshot(apps, schema_editor):
+    OrderItems = apps.get_model('main', 'OrderItems')
+    batch = []
+    for item in OrderItems.objects.select_related('product').iterator(chunk_size=1000):
+        price = item.product.new_price or item.product.price
+        item.title = item.product.title
+        item.price = price
+        item.discount = item.product.price - price
+        item.line_total = price * item.quantity
+        batch.append(item)
+        if len(batch) >= 1000:
+            OrderItems.objects.bulk_update(batch, ['title', 'price', 'discount', 'line_total'])
+            batch = []
+    if batch:
+        OrderItems.objects.bulk_update(batch, ['title', 'price', 'discount', 'line_total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_alter_coffeeshop_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitems',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Скидка за единицу'),
+        ),
+        migrations.AddField(
+            model_name='orderitems',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Сумма позиции'),
+        ),
+        migrations.AddField(
+            model_name='orderitems',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Цена за единицу'),
+        ),
+        migrations.AddField(
+            model_name='orderitems',
+            name='title',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Название товара'),
+        ),
+        migrations.RunPython(backfill_price_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """
+    Сливает повторные позиции одного товара в корзине перед уникальным
+    ограничением: количества складываются в первую позицию, остальные
+    удаляются. Сумма корзины от этого не меняется.
+    """
+    BasketItems = apps.get_model('main', 'BasketItems')
+
+    first = {}
+    duplicates = []
+    for item in BasketItems.objects.order_by('id').only('id', 'basket_id', 'product_id', 'quantity'):
+        kept = first.setdefault((item.basket_id, item.product_id), item)
+        if kept.pk != item.pk:
+            kept.quantity += item.quantity
+            kept.merged = True
+            duplicates.append(item.pk)
+
+    BasketItems.objects.bulk_update(
+        [item for item in first.values() if getattr(item, 'merged', False)], ['quantity'], batch_size=500
+    )
+    BasketItems.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_orderitems_price_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='basketitems',
+            constraint=models.UniqueConstraint(fields=('basket', 'product'), name='unique_basket_product'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def create_product_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS main_product_fts USING fts5("
+        "title, description, category, ingredients, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+    Product = apps.get_model('main', 'Product')
+    normalize = lambda text: (text or '').lower().replace('ё', 'е')
+    rows = [
+        (
+            product.pk,
+            normalize(product.title),
+            normalize(product.description),
+            normalize(product.category.title),
+            normalize(' '.join(item.ingredient.title for item in product.ingredients.all())),
+        )
+        for product in Product.objects.select_related('category').prefetch_related('ingredients__ingredient')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO main_product_fts (rowid, title, description, category, ingredients) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def drop_product_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS main_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_basketitems_unique_basket_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_fts, drop_product_fts),
+    ]
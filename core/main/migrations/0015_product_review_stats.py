@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:13
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_review_stats(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    Review = apps.get_model('main', 'Review')
+    stats = Review.objects.values('product').annotate(count=Count('id'), total=Sum('rating'))
+    products = []
+    for row in stats:
+        product = Product(pk=row['product'], review_count=row['count'], rating_sum=row['total'])
+        product.rating = (Decimal(row['total']) / row['count']).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
+        products.append(product)
+    Product.objects.bulk_update(products, ['review_count', 'rating_sum', 'rating'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_product_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество отзывов'),
+        ),
+        migrations.RunPython(backfill_review_stats, migrations.RunPython.noop),
+    ]
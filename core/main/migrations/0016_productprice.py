@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:14
+
+import django.db.models.deletion
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_product_prices(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    ProductPrice = apps.get_model('main', 'ProductPrice')
+    Promotion = apps.get_model('main', 'Promotion')
+
+    # Та же дата, что у main.pricing.refresh_effective_prices
+    today = timezone.localdate()
+    best = {}
+    links = Promotion.products.through.objects.filter(promotion__start_date__lte=today, promotion__end_date__gte=today)
+    for product_id, promotion_id, discount in links.values_list('product_id', 'promotion_id', 'promotion__discount_percent'):
+        if discount > best.get(product_id, (0, None))[0]:
+            best[product_id] = (discount, promotion_id)
+
+    rows = []
+    for product in Product.objects.all():
+        discount, promotion_id = best.get(product.pk, (0, None))
+        price = product.new_price or product.price
+        if discount:
+            promo = (product.price * (100 - discount) / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            price = min(price, promo)
+        rows.append(ProductPrice(product_id=product.pk, price=price, promotion_id=promotion_id))
+    ProductPrice.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_product_review_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Итоговая цена')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pricing', to='main.product', verbose_name='Товар')),
+                ('promotion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.promotion', verbose_name='Акция')),
+            ],
+            options={
+                'verbose_name': 'Итоговая цена',
+                'verbose_name_plural': 'Итоговые цены',
+            },
+        ),
+        migrations.RunPython(populate_product_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+def backfill_keys(apps, schema_editor):
+    """
+    Готовит естественные ключи для импорта каталога: артикулы существующим
+    товарам, слияние категорий и ингредиентов-дублей по названию и удаление
+    повторных связей товар–ингредиент (остаётся первая).
+    """
+    Product = apps.get_model('main', 'Product')
+    Category = apps.get_model('main', 'Category')
+    Ingredient = apps.get_model('main', 'Ingredient')
+    ProductIngredient = apps.get_model('main', 'ProductIngredient')
+
+    products = list(Product.objects.filter(sku__isnull=True).only('id'))
+    for product in products:
+        product.sku = f'P{product.pk:06d}'
+    Product.objects.bulk_update(products, ['sku'], batch_size=500)
+
+    keep = {}
+    for category in Category.objects.order_by('id'):
+        first = keep.setdefault(category.title, category)
+        if first.pk == category.pk:
+            continue
+        Product.objects.filter(category=category).update(category=first)
+        category.delete()
+
+    keep = {}
+    for ingredient in Ingredient.objects.order_by('id'):
+        first = keep.setdefault(ingredient.title, ingredient)
+        if first.pk == ingredient.pk:
+            continue
+        ProductIngredient.objects.filter(ingredient=ingredient).update(ingredient=first)
+        if ingredient.is_allergen and not first.is_allergen:
+            first.is_allergen = True
+            first.save(update_fields=['is_allergen'])
+        ingredient.delete()
+
+    seen = set()
+    duplicates = []
+    for pk, product_id, ingredient_id in ProductIngredient.objects.order_by('id').values_list(
+        'id', 'product_id', 'ingredient_id'
+    ):
+        if (product_id, ingredient_id) in seen:
+            duplicates.append(pk)
+        seen.add((product_id, ingredient_id))
+    ProductIngredient.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Артикул'),
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+    ]
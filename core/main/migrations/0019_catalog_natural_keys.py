@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_catalog_natural_keys_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='title',
+            field=models.CharField(max_length=100, unique=True, verbose_name='Название категории'),
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='title',
+            field=models.CharField(max_length=100, unique=True, verbose_name='Название'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Артикул'),
+        ),
+        migrations.AddConstraint(
+            model_name='productingredient',
+            constraint=models.UniqueConstraint(fields=('product', 'ingredient'), name='unique_product_ingredient'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_catalog_natural_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Час'), ('day', 'День')], max_length=4, verbose_name='Период')),
+                ('bucket', models.DateTimeField(verbose_name='Начало периода')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Продано единиц')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('payment_method', models.CharField(blank=True, default='', max_length=20, verbose_name='Метод оплаты')),
+            ],
+            options={
+                'verbose_name': 'Продажи по способу оплаты',
+                'verbose_name_plural': 'Продажи по способам оплаты',
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket', 'payment_method'), name='unique_payment_sales_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CategorySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Час'), ('day', 'День')], max_length=4, verbose_name='Период')),
+                ('bucket', models.DateTimeField(verbose_name='Начало периода')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Продано единиц')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Продажи категории',
+                'verbose_name_plural': 'Продажи по категориям',
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket', 'category'), name='unique_category_sales_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Час'), ('day', 'День')], max_length=4, verbose_name='Период')),
+                ('bucket', models.DateTimeField(verbose_name='Начало периода')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('units', models.PositiveIntegerField(default=0, verbose_name='Продано единиц')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Продажи товара',
+                'verbose_name_plural': 'Продажи по товарам',
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket', 'product'), name='unique_product_sales_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BestSellerWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_days', models.PositiveIntegerField(verbose_name='Длина окна, дней')),
+                ('start', models.DateField(verbose_name='Первый день окна')),
+                ('end', models.DateField(verbose_name='Последний день окна')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Окно бестселлеров',
+                'verbose_name_plural': 'Окно бестселлеров',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units', models.IntegerField(default=0, verbose_name='Продано единиц')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Продажи товара за окно',
+                'verbose_name_plural': 'Продажи товаров за окно',
+            },
+        ),
+        migrations.CreateModel(
+            name='BestSeller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField(verbose_name='Место')),
+                ('units', models.IntegerField(verbose_name='Продано единиц за окно')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.category', verbose_name='Категория')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='best_seller_ranks', to='main.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Бестселлер',
+                'verbose_name_plural': 'Бестселлеры',
+                'ordering': ['category', 'rank'],
+                'indexes': [models.Index(fields=['category', 'rank'], name='best_seller_category_rank')],
+            },
+        ),
+    ]
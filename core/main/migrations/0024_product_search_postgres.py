@@ -0,0 +1,58 @@
+from django.db import migrations
+
+
+def create_product_search(apps, schema_editor):
+    """
+    Индекс поиска для PostgreSQL: сохранённый tsvector под GIN вместо
+    вектора, который строился в каждом запросе по всему каталогу, и текст
+    под триграммный индекс pg_trgm для поиска с опечатками. На SQLite его
+    роль играет FTS5-таблица из 0014.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE TABLE IF NOT EXISTS main_product_search ("
+        "product_id bigint PRIMARY KEY REFERENCES main_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "document tsvector NOT NULL, words text NOT NULL)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS main_product_search_document ON main_product_search USING gin (document)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS main_product_search_words ON main_product_search USING gin (words gin_trgm_ops)"
+    )
+
+    Product = apps.get_model('main', 'Product')
+    normalize = lambda text: (text or '').lower().replace('ё', 'е')
+    rows = []
+    for product in Product.objects.select_related('category').prefetch_related('ingredients__ingredient'):
+        title, category = normalize(product.title), normalize(product.category.title)
+        ingredients = normalize(' '.join(item.ingredient.title for item in product.ingredients.all()))
+        rows.append((
+            product.pk, title, category, ingredients, normalize(product.description),
+            ' '.join((title, category, ingredients)),
+        ))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO main_product_search (product_id, document, words) VALUES (%s, "
+            "setweight(to_tsvector('russian', %s), 'A') || setweight(to_tsvector('russian', %s), 'B') || "
+            "setweight(to_tsvector('russian', %s), 'C') || setweight(to_tsvector('russian', %s), 'D'), %s)",
+            rows,
+        )
+
+
+def drop_product_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS main_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_search, drop_product_search),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_missing_stock(apps, schema_editor):
+    """
+    Заводит нулевой остаток товарам без строки склада: резерв и списание
+    (main.stock) работают только по ней. Остаток потом выставляется в
+    админке или импортом каталога.
+    """
+    Product = apps.get_model('main', 'Product')
+    Stock = apps.get_model('main', 'Stock')
+    Stock.objects.bulk_create(
+        [Stock(product_id=pk) for pk in Product.objects.filter(stock__isnull=True).values_list('pk', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_product_search_postgres'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_stock, migrations.RunPython.noop),
+    ]
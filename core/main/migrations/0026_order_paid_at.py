@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_paid_at(apps, schema_editor):
+    """
+    Время оплаты раньше не хранилось: уже оплаченным заказам ставим дату
+    создания — по ней они и лежат в текущих сводках.
+    """
+    Order = apps.get_model('main', 'Order')
+    Order.objects.filter(
+        status__in=('Оплачен', 'В обработке', 'Доставлен'), paid_at__isnull=True
+    ).update(paid_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0025_backfill_stock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата оплаты'),
+        ),
+        migrations.RunPython(backfill_paid_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['paid_at'], name='order_paid'),
+        ),
+    ]
@@ -1,12 +1,18 @@
+from decimal import Decimal
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 import secrets
 import string
 
 User = get_user_model()
 
 class Category(models.Model):
-    title = models.CharField("Название категории", max_length=100)
+    title = models.CharField("Название категории", max_length=100, unique=True)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
 
     class Meta:
         verbose_name = "Категория"
@@ -19,24 +25,60 @@ class Category(models.Model):
 
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="products", verbose_name="Категория")
+    sku = models.CharField("Артикул", max_length=64, unique=True, null=True, blank=True)
     title = models.CharField("Название", max_length=200)
     description = models.TextField("Описание", blank=True)
     cover = models.ImageField("Обложка", upload_to="product_cover/", blank=True, null=True)
     price = models.DecimalField("Цена", max_digits=10, decimal_places=2)
     new_price = models.DecimalField("Цена со скидкой", max_digits=10, decimal_places=2, null=True, blank=True)
     rating = models.DecimalField("Рейтинг", max_digits=3, decimal_places=1, default=0.0)
+    review_count = models.PositiveIntegerField("Количество отзывов", default=0)
+    rating_sum = models.PositiveIntegerField("Сумма оценок", default=0)
     is_best_seller = models.BooleanField("Бестселлер", default=False)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
 
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ["title"]
+        indexes = [
+            # Каталог с фильтром по категории и сортировкой по названию
+            models.Index(fields=["category", "title"], name="product_category_title"),
+            # Ручные бестселлеры — небольшая доля товаров, частичный индекс
+            models.Index(fields=["title"], condition=Q(is_best_seller=True), name="product_best_seller_title"),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_price(self):
-        return self.new_price or self.price
+        """Итоговая цена с учётом акций (см. main.pricing); без строки в таблице цен — цена товара."""
+        try:
+            return self.pricing.price
+        except ObjectDoesNotExist:
+            return self.new_price or self.price
+
+    @classmethod
+    def apply_review_delta(cls, product_id, count_delta, rating_delta):
+        """
+        Атомарно сдвигает счётчики отзывов и пересчитывает средний рейтинг
+        в том же UPDATE, не агрегируя таблицу отзывов.
+        """
+        count = F("review_count") + count_delta
+        average = Cast(
+            Cast(F("rating_sum") + rating_delta, models.FloatField()) / count,
+            models.DecimalField(max_digits=10, decimal_places=4),
+        )
+        cls.objects.filter(pk=product_id).update(
+            review_count=count,
+            rating_sum=F("rating_sum") + rating_delta,
+            updated_at=timezone.now(),
+            rating=Case(
+                When(review_count=-count_delta, then=Value(Decimal("0.0"))),
+                default=Round(average, 1),
+                output_field=models.DecimalField(max_digits=3, decimal_places=1),
+            ),
+        )
 
 
 class Banner(models.Model):
@@ -47,11 +89,15 @@ class Banner(models.Model):
     title = models.CharField("Заголовок", max_length=255)
     image = models.ImageField("Изображение", upload_to="banners/")
     location = models.CharField("Расположение", max_length=50, choices=LOCATION_CHOICES)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
 
     class Meta:
         verbose_name = "Баннер"
         verbose_name_plural = "Баннеры"
         ordering = ["location"]
+        indexes = [
+            models.Index(fields=["location"], name="banner_location"),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.location})"
@@ -60,6 +106,7 @@ class CoffeeShop(models.Model):
     name = models.CharField(max_length=255, verbose_name="Название кофейни")
     banner = models.ImageField(upload_to="coffee_banners/", verbose_name="Баннер")
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
 
     def __str__(self):
         return self.name
@@ -77,10 +124,22 @@ class Basket(models.Model):
         verbose_name = "Корзина"
         verbose_name_plural = "Корзины"
 
+    def add_to_total(self, amount):
+        """Атомарно сдвигает сумму корзины на amount (может быть отрицательным)."""
+        Basket.objects.filter(pk=self.pk).update(total_price=F("total_price") + amount)
+
     def update_total(self):
-        total = sum(item.get_subtotal() for item in self.items.all())
-        self.total_price = total
-        self.save()
+        self.total_price = self.items.aggregate(
+            total=Coalesce(
+                Sum(
+                    F("quantity") * Coalesce("product__pricing__price", "product__new_price", "product__price"),
+                    output_field=models.DecimalField(),
+                ),
+                Value(Decimal("0.00")),
+                output_field=models.DecimalField(),
+            )
+        )["total"]
+        self.save(update_fields=["total_price"])
 
     def __str__(self):
         return f"Корзина #{self.pk} - {self.total_price} сом"
@@ -94,6 +153,9 @@ class BasketItems(models.Model):
     class Meta:
         verbose_name = "Товар в корзине"
         verbose_name_plural = "Товары в корзине"
+        constraints = [
+            models.UniqueConstraint(fields=["basket", "product"], name="unique_basket_product"),
+        ]
 
     def get_subtotal(self):
         return self.product.get_price() * self.quantity
@@ -114,10 +176,13 @@ class Order(models.Model):
         ("Cash", "Наличные"),
         ("Online", "Онлайн-платёж"),
     ]
+    # Статусы, в которых заказ уже оплачен и учтён в аналитике
+    PAID_STATUSES = ("Оплачен", "В обработке", "Доставлен")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
     total_price = models.DecimalField("Общая сумма", max_digits=10, decimal_places=2)
     status = models.CharField("Статус", max_length=20, choices=STATUS_CHOICES, default="Создан")
     created_at = models.DateTimeField("Дата создания", auto_now_add=True)
+    paid_at = models.DateTimeField("Дата оплаты", null=True, blank=True)
 
     transaction_id = models.CharField("ID транзакции", max_length=50, unique=True, null=True, blank=True)
     payment_method = models.CharField("Метод оплаты", max_length=20, choices=PAYMENT_METHODS, null=True, blank=True)
@@ -148,6 +213,14 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ["-created_at"]
+        indexes = [
+            # История заказов пользователя: фильтр по user, курсор по (-created_at, -id)
+            models.Index(fields=["user", "-created_at", "-id"], name="order_user_created"),
+            # Выгрузка заказов за период (main.exports)
+            models.Index(fields=["created_at", "id"], name="order_created"),
+            # Пересборка сводок продаж за период оплаты (main.analytics)
+            models.Index(fields=["paid_at"], name="order_paid"),
+        ]
 
 
 
@@ -156,15 +229,34 @@ class OrderItems(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="Товар")
     quantity = models.PositiveIntegerField("Количество", default=1)
 
+    # Снимок цены на момент оформления: история заказов не зависит от текущих цен
+    title = models.CharField("Название товара", max_length=200, blank=True)
+    price = models.DecimalField("Цена за единицу", max_digits=10, decimal_places=2, default=0)
+    discount = models.DecimalField("Скидка за единицу", max_digits=10, decimal_places=2, default=0)
+    line_total = models.DecimalField("Сумма позиции", max_digits=10, decimal_places=2, default=0)
+
     class Meta:
         verbose_name = "Товар в заказе"
         verbose_name_plural = "Товары в заказе"
 
+    @classmethod
+    def from_product(cls, order, product, quantity):
+        price = product.get_price()
+        return cls(
+            order=order,
+            product=product,
+            quantity=quantity,
+            title=product.title,
+            price=price,
+            discount=product.price - price,
+            line_total=price * quantity,
+        )
+
     def get_subtotal(self):
-        return self.product.get_price() * self.quantity
+        return self.line_total
 
     def __str__(self):
-        return f"{self.product.title} × {self.quantity}"
+        return f"{self.title} × {self.quantity}"
 
 
 class Promotion(models.Model):
@@ -174,6 +266,7 @@ class Promotion(models.Model):
     start_date = models.DateField("Начало")
     end_date = models.DateField("Конец")
     products = models.ManyToManyField(Product, verbose_name="Товары в акции", blank=True)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
 
     class Meta:
         verbose_name = "Акция"
@@ -183,6 +276,23 @@ class Promotion(models.Model):
         return f"{self.title} ({self.discount_percent}%)"
 
 
+class ProductPrice(models.Model):
+    """Предрасчитанная итоговая цена товара, обновляется в main.pricing."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="pricing", verbose_name="Товар")
+    price = models.DecimalField("Итоговая цена", max_digits=10, decimal_places=2)
+    promotion = models.ForeignKey(
+        Promotion, on_delete=models.SET_NULL, null=True, blank=True, related_name="+", verbose_name="Акция"
+    )
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
+
+    class Meta:
+        verbose_name = "Итоговая цена"
+        verbose_name_plural = "Итоговые цены"
+
+    def __str__(self):
+        return f"{self.product_id} - {self.price}"
+
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reviews")
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="reviews")
@@ -194,13 +304,16 @@ class Review(models.Model):
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["product", "-created_at"], name="review_product_created"),
+        ]
 
     def __str__(self):
         return f"{self.product.title} - {self.rating}⭐"
 
 
 class Ingredient(models.Model):
-    title = models.CharField("Название", max_length=100)
+    title = models.CharField("Название", max_length=100, unique=True)
     is_allergen = models.BooleanField("Аллерген", default=False)
 
     class Meta:
@@ -219,6 +332,9 @@ class ProductIngredient(models.Model):
     class Meta:
         verbose_name = "Ингредиент в продукте"
         verbose_name_plural = "Ингредиенты в продуктах"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "ingredient"], name="unique_product_ingredient"),
+        ]
 
     def __str__(self):
         return f"{self.ingredient.title} для {self.product.title}"
@@ -227,15 +343,39 @@ class ProductIngredient(models.Model):
 class Stock(models.Model):
     product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="stock")
     quantity = models.PositiveIntegerField("Количество на складе", default=0)
+    reserved = models.PositiveIntegerField("Зарезервировано", default=0)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
 
     class Meta:
         verbose_name = "Склад"
         verbose_name_plural = "Складские остатки"
 
+    @property
+    def available(self):
+        return self.quantity - self.reserved
+
     def __str__(self):
         return f"{self.product.title} - {self.quantity} шт."
 
 
+class StockReservation(models.Model):
+    """Временный резерв товара за пользователем (см. main.stock)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="stock_reservations", verbose_name="Пользователь")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations", verbose_name="Товар")
+    quantity = models.PositiveIntegerField("Количество")
+    expires_at = models.DateTimeField("Действует до", db_index=True)
+
+    class Meta:
+        verbose_name = "Резерв товара"
+        verbose_name_plural = "Резервы товаров"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "product"], name="unique_user_product_reservation"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} × {self.quantity} до {self.expires_at:%H:%M}"
+
+
 class PickupPoint(models.Model):
     title = models.CharField("Название точки", max_length=200)
     address = models.CharField("Адрес", max_length=255)
@@ -249,4 +389,133 @@ class PickupPoint(models.Model):
         return self.title
 
 
+class SalesRollup(models.Model):
+    """
+    Предагрегированные продажи за час или день (см. main.analytics).
+    Строки только прибавляются при оплате заказа и пересобираются
+    командой backfill_sales_rollups.
+    """
+    GRANULARITY_CHOICES = [
+        ("hour", "Час"),
+        ("day", "День"),
+    ]
+    granularity = models.CharField("Период", max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField("Начало периода")
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField("Продано единиц", default=0)
+    order_count = models.PositiveIntegerField("Заказов", default=0)
+
+    class Meta:
+        abstract = True
+
+
+class ProductSalesRollup(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+", verbose_name="Товар")
 
+    class Meta:
+        verbose_name = "Продажи товара"
+        verbose_name_plural = "Продажи по товарам"
+        constraints = [
+            models.UniqueConstraint(fields=["granularity", "bucket", "product"], name="unique_product_sales_bucket"),
+        ]
+
+
+class CategorySalesRollup(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+", verbose_name="Категория")
+
+    class Meta:
+        verbose_name = "Продажи категории"
+        verbose_name_plural = "Продажи по категориям"
+        constraints = [
+            models.UniqueConstraint(fields=["granularity", "bucket", "category"], name="unique_category_sales_bucket"),
+        ]
+
+
+class PaymentSalesRollup(SalesRollup):
+    # Пустая строка — способ оплаты не указан
+    payment_method = models.CharField("Метод оплаты", max_length=20, blank=True, default="")
+
+    class Meta:
+        verbose_name = "Продажи по способу оплаты"
+        verbose_name_plural = "Продажи по способам оплаты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["granularity", "bucket", "payment_method"], name="unique_payment_sales_bucket"
+            ),
+        ]
+
+
+class ProductSalesWindow(models.Model):
+    """Продажи товара за скользящее окно бестселлеров (см. main.bestsellers)."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name="+", verbose_name="Товар")
+    units = models.IntegerField("Продано единиц", default=0)
+    revenue = models.DecimalField("Выручка", max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Продажи товара за окно"
+        verbose_name_plural = "Продажи товаров за окно"
+
+
+class BestSellerWindow(models.Model):
+    """Какие дни сейчас учтены в ProductSalesWindow; одна строка."""
+    window_days = models.PositiveIntegerField("Длина окна, дней")
+    start = models.DateField("Первый день окна")
+    end = models.DateField("Последний день окна")
+    updated_at = models.DateTimeField("Пересчитано", auto_now=True)
+
+    class Meta:
+        verbose_name = "Окно бестселлеров"
+        verbose_name_plural = "Окно бестселлеров"
+
+
+class BestSeller(models.Model):
+    """Готовый рейтинг бестселлеров: общий (category пустая) и по категориям."""
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="best_seller_ranks", verbose_name="Товар"
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True, related_name="+", verbose_name="Категория"
+    )
+    rank = models.PositiveIntegerField("Место")
+    units = models.IntegerField("Продано единиц за окно")
+
+    class Meta:
+        verbose_name = "Бестселлер"
+        verbose_name_plural = "Бестселлеры"
+        ordering = ["category", "rank"]
+        indexes = [
+            models.Index(fields=["category", "rank"], name="best_seller_category_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.rank}. {self.product_id}"
+
+    @classmethod
+    def _ranked(cls, category, limit):
+        return (
+            cls.objects.filter(category=category)
+            .select_related("product__category", "product__pricing")
+            .order_by("rank")[:limit]
+        )
+
+    @staticmethod
+    def _fallback(category, limit):
+        fallback = Product.objects.select_related("category", "pricing").filter(is_best_seller=True)
+        if category is not None:
+            fallback = fallback.filter(category=category)
+        return fallback[:limit]
+
+    @classmethod
+    def top_products(cls, category=None, limit=5):
+        """
+        Бестселлеры из готового рейтинга — один запрос по индексу (category, rank).
+        Пока рейтинг не посчитан, берутся товары с ручным флагом is_best_seller.
+        """
+        ranked = [row.product for row in cls._ranked(category, limit)]
+        return ranked or list(cls._fallback(category, limit))
+
+    @classmethod
+    async def atop_products(cls, category=None, limit=5):
+        """То же, что top_products, для async-представлений."""
+        ranked = [row.product async for row in cls._ranked(category, limit)]
+        return ranked or [product async for product in cls._fallback(category, limit)]
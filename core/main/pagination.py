@@ -0,0 +1,28 @@
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "id"
+
+    def get_ordering(self, request, queryset, view):
+        # Результаты поиска листаем в порядке релевантности, если клиент не задал свою сортировку
+        if "search_rank" in queryset.query.annotations and OrderingFilter.ordering_param not in request.query_params:
+            ordering = ("search_rank",)
+        else:
+            ordering = tuple(super().get_ordering(request, queryset, view))
+        # Цена, название и рейтинг не уникальны: без id порядок равных строк между
+        # запросами не определён, и курсор может пропустить или повторить товар
+        if ordering[-1].lstrip("-") != "id":
+            ordering += ("-id" if ordering[0].startswith("-") else "id",)
+        return ordering
+
+
+class OrderCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,140 @@
+"""
+Быстрая сериализация списков. DRF на каждую строку заново проходит по
+полям сериализатора: get_attribute с разбором source, проверки SkipField и
+PKOnlyObject, to_representation общего вида. Здесь поля разбираются один
+раз на список — в план (имя, получение значения, преобразование), — и
+строки превращаются в словари по готовому плану. Вывод совпадает с
+ModelSerializer байт в байт (см. GoldenOutputTests).
+"""
+import inspect
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+from rest_framework.fields import SkipField, is_simple_callable
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+
+def _getter(field, model):
+    """Функция instance -> значение поля с той же семантикой, что Field.get_attribute."""
+    attrs = field.source_attrs
+    if not attrs:
+        # source="*" — значением служит сам объект (SerializerMethodField)
+        return lambda instance: instance
+
+    if (
+        model is not None and len(attrs) == 1
+        and isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None
+    ):
+        # Внешний ключ без запроса к связанной таблице: product -> product_id
+        try:
+            attname = model._meta.get_field(attrs[0]).attname
+        except FieldDoesNotExist:
+            return field.get_attribute
+        return lambda instance: getattr(instance, attname)
+
+    if len(attrs) != 1:
+        return field.get_attribute
+    name = attrs[0]
+
+    if _is_simple_method(getattr(model, name, None)):
+        # Метод модели вроде get_price: сигнатура проверена один раз, а не на каждой строке
+        return lambda instance: getattr(instance, name)()
+
+    def get(instance):
+        try:
+            value = getattr(instance, name)
+        except (AttributeError, ObjectDoesNotExist):
+            # Пропуски, значения по умолчанию и allow_null — как в DRF
+            return field.get_attribute(instance)
+        if callable(value) and is_simple_callable(value):
+            value = value()
+        return value
+
+    return get
+
+
+def _is_simple_method(member):
+    """Метод модели, который DRF вызвал бы без аргументов (is_simple_callable для bound-метода)."""
+    if not inspect.isfunction(member):
+        return False
+    params = list(inspect.signature(member).parameters.values())[1:]
+    return all(
+        param.default is not param.empty or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD)
+        for param in params
+    )
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = -field.decimal_places
+
+    def convert(value):
+        # Значения из базы уже округлены до decimal_places, quantize им не нужен
+        if type(value) is Decimal and value.as_tuple().exponent == exponent:
+            return format(value, "f")
+        return field.to_representation(value)
+
+    return convert
+
+
+def _converter(field):
+    if isinstance(field, serializers.ListSerializer):
+        plan = compile_plan(field.child)
+
+        def convert(value):
+            items = value.all() if isinstance(value, BaseManager) else value
+            return [serialize(plan, item) for item in items]
+
+        return convert
+    if isinstance(field, serializers.BaseSerializer):
+        plan = compile_plan(field)
+        return lambda value: serialize(plan, value)
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return lambda value: value.pk if isinstance(value, PKOnlyObject) else value
+    if type(field) is serializers.IntegerField:
+        return int
+    if type(field) is serializers.CharField:
+        return str
+    if type(field) is serializers.DecimalField:
+        return _decimal_converter(field)
+    return field.to_representation
+
+
+def compile_plan(serializer):
+    """План сериализации для уже привязанного сериализатора (с учётом ?fields= и контекста)."""
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    return [
+        (field.field_name, _getter(field, model), _converter(field))
+        for field in serializer._readable_fields
+    ]
+
+
+def serialize(plan, instance):
+    data = {}
+    for name, get, convert in plan:
+        try:
+            value = get(instance)
+        except SkipField:
+            continue
+        if value is None or (isinstance(value, PKOnlyObject) and value.pk is None):
+            data[name] = None
+        else:
+            data[name] = convert(value)
+    return data
+
+
+class PlannedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer, который строит план по child один раз и применяет его ко
+    всем строкам. Подключается через Meta.list_serializer_class.
+    """
+
+    def to_representation(self, data):
+        plan = compile_plan(self.child)
+        items = data.all() if isinstance(data, BaseManager) else data
+        return [serialize(plan, item) for item in items]
@@ -0,0 +1,82 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import invalidate_index_payload
+from .invalidation import invalidate_all_product_details, invalidate_product_details
+from .models import Product, ProductPrice, Promotion
+
+
+def price_expression(prefix=""):
+    """Выражение итоговой цены для агрегатов: таблица цен, затем цены самого товара."""
+    return Coalesce(f"{prefix}pricing__price", f"{prefix}new_price", f"{prefix}price")
+
+
+def calculate_price(product, discount_percent=0):
+    """
+    Правило расчёта: акции не суммируются, действует максимальная скидка
+    из активных акций, считается от обычной цены. Если цена со скидкой
+    (new_price) ниже акционной — остаётся она.
+    """
+    base = product.new_price or product.price
+    if not discount_percent:
+        return base
+    promo = (product.price * (100 - discount_percent) / 100).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return min(base, promo)
+
+
+def active_discounts(product_ids=None, day=None):
+    """{product_id: (discount_percent, promotion_id)} — лучшая активная акция на дату."""
+    day = day or timezone.localdate()
+    links = Promotion.products.through.objects.filter(
+        promotion__start_date__lte=day, promotion__end_date__gte=day
+    )
+    if product_ids is not None:
+        links = links.filter(product_id__in=product_ids)
+
+    best = {}
+    for product_id, promotion_id, discount in links.values_list(
+        "product_id", "promotion_id", "promotion__discount_percent"
+    ):
+        if discount > best.get(product_id, (0, None))[0]:
+            best[product_id] = (discount, promotion_id)
+    return best
+
+
+def refresh_effective_prices(product_ids=None, day=None):
+    """
+    Пересчитывает таблицу итоговых цен для товаров (или для всего каталога)
+    одним upsert. Возвращает число обновлённых строк.
+    """
+    products = Product.objects.only("id", "price", "new_price")
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        products = products.filter(pk__in=product_ids)
+
+    discounts = active_discounts(product_ids, day)
+    rows = []
+    for product in products:
+        discount, promotion_id = discounts.get(product.pk, (0, None))
+        rows.append(ProductPrice(
+            product_id=product.pk,
+            price=calculate_price(product, discount),
+            promotion_id=promotion_id,
+        ))
+
+    ProductPrice.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["price", "promotion", "updated_at"],
+        batch_size=500,
+    )
+    invalidate_index_payload()
+    if product_ids is None:
+        invalidate_all_product_details()
+    else:
+        invalidate_product_details(product_ids)
+    return len(rows)
+
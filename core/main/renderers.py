@@ -0,0 +1,76 @@
+"""
+JSON-рендерер для REST_FRAMEWORK. С установленным orjson данные
+кодируются им (в разы быстрее стандартного json), без него — обычным
+JSONRenderer DRF. Вывод в обоих случаях одинаковый: компактный JSON в
+UTF-8, Decimal — числом, datetime — ISO 8601 с Z для UTC, как у DRF.
+"""
+import math
+
+from django.db.models.fields.files import FieldFile
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class CoffeeJSONEncoder(JSONEncoder):
+    """JSONEncoder DRF, который ещё отдаёт файлы и картинки моделей ссылкой."""
+
+    def default(self, obj):
+        if isinstance(obj, FieldFile):
+            return obj.url if obj else None
+        return super().default(obj)
+
+
+_encoder = CoffeeJSONEncoder()
+
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+# DRF экранирует U+2028/U+2029, чтобы JSON оставался подмножеством JavaScript
+LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+def has_non_finite(data):
+    """Есть ли в данных NaN или ±Infinity: orjson молча пишет их как null."""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    encoder_class = CoffeeJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Decimal, ленивые строки перевода, файлы и прочее orjson не знает — их
+            # кодирует default; datetime, date, UUID и вложенные dict/list — сам orjson
+            ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Например, целое больше 64 бит: такие данные кодирует стандартный json
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"null" in ret and has_non_finite(data):
+            # Такие числа обрабатывает JSONRenderer DRF: при STRICT_JSON — ValueError, иначе NaN/Infinity
+            return super().render(data, accepted_media_type, renderer_context)
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
@@ -0,0 +1,72 @@
+import datetime
+import heapq
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Promotion
+from .pricing import refresh_effective_prices
+
+
+def boundary(day):
+    """Начало дня в текущей таймзоне: момент, когда меняется набор активных акций."""
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+class PromotionScheduler:
+    """
+    Очередь ближайших границ акций (начало start_date и конец end_date),
+    упорядоченная по времени. На каждой границе пересчитываются цены только
+    товаров тех акций, чья граница наступила.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.queued = set()
+
+    def load(self, now):
+        """Добавляет будущие границы всех ещё не закончившихся акций."""
+        today = timezone.localtime(now).date()
+        promotions = Promotion.objects.filter(end_date__gte=today).values_list("id", "start_date", "end_date")
+        for promotion_id, start_date, end_date in promotions:
+            for day in (start_date, end_date + datetime.timedelta(days=1)):
+                entry = (boundary(day), promotion_id)
+                if entry[0] > now and entry not in self.queued:
+                    heapq.heappush(self.heap, entry)
+                    self.queued.add(entry)
+
+    def next_boundary(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        promotion_ids = set()
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            self.queued.discard(entry)
+            promotion_ids.add(entry[1])
+        return promotion_ids
+
+    def run_due(self, now):
+        """Пересчитывает цены товаров акций, чьи границы наступили. Возвращает число товаров."""
+        promotion_ids = self.pop_due(now)
+        if not promotion_ids:
+            return 0
+        return refresh_promotion_products(promotion_ids, timezone.localtime(now).date())
+
+
+def refresh_promotion_products(promotion_ids, day=None):
+    product_ids = set(
+        Promotion.products.through.objects.filter(promotion_id__in=promotion_ids).values_list("product_id", flat=True)
+    )
+    return refresh_effective_prices(product_ids, day)
+
+
+def recently_switched_promotions(day, days=1):
+    """Акции, начавшиеся или закончившиеся за последние days дней — для догоняющего пересчёта."""
+    since = day - datetime.timedelta(days=days - 1)
+    return set(
+        Promotion.objects.filter(
+            Q(start_date__range=(since, day))
+            | Q(end_date__range=(since - datetime.timedelta(days=1), day - datetime.timedelta(days=1)))
+        ).values_list("id", flat=True)
+    )
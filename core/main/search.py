@@ -0,0 +1,182 @@
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import Product
+
+FTS_TABLE = "main_product_fts"
+
+# PostgreSQL: tsvector с весами под GIN-индексом и текст для pg_trgm (миграция 0024)
+PG_SEARCH_TABLE = "main_product_search"
+
+# Сколько лучших совпадений отдаём в выдачу. Страницы поиска листаются
+# курсором внутри этого списка, поэтому дальше него выдача не идёт —
+# ограничение описано в help_text фильтра search (main.filters)
+MAX_RESULTS = 500
+
+# Веса bm25 по колонкам: title, description, category, ingredients
+FTS_WEIGHTS = (10.0, 1.0, 3.0, 2.0)
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+INSERT_SQL = f"INSERT INTO {FTS_TABLE} (rowid, title, description, category, ingredients) VALUES (%s, %s, %s, %s, %s)"
+
+# Веса A–D те же, что у bm25 на SQLite: название, категория, ингредиенты, описание
+PG_UPSERT_SQL = (
+    f"INSERT INTO {PG_SEARCH_TABLE} (product_id, document, words) VALUES (%s, "
+    "setweight(to_tsvector('russian', %s), 'A') || setweight(to_tsvector('russian', %s), 'B') || "
+    "setweight(to_tsvector('russian', %s), 'C') || setweight(to_tsvector('russian', %s), 'D'), %s) "
+    "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document, words = EXCLUDED.words"
+)
+
+
+def normalize(text):
+    return (text or "").lower().replace("ё", "е")
+
+
+def tokenize(query):
+    return WORD_RE.findall(normalize(query))
+
+
+def short_prefix(word):
+    # Другое окончание слова (падеж, число): ищем по первым двум третям.
+    # Это совпадение по префиксу, опечатку в начале слова оно не переживёт
+    return word[:max(3, len(word) * 2 // 3)]
+
+
+def is_indexed_vendor():
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+def _write_rows(rows, product_ids=None):
+    """
+    Заменяет строки индекса. rows — (product_id, title, description,
+    category, ingredients) в normalize; product_ids — какие строки удалить
+    перед записью (None — весь индекс).
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            if product_ids is None:
+                cursor.execute(f"DELETE FROM {PG_SEARCH_TABLE}")
+            elif product_ids:
+                cursor.execute(f"DELETE FROM {PG_SEARCH_TABLE} WHERE product_id = ANY(%s)", [list(product_ids)])
+            cursor.executemany(PG_UPSERT_SQL, [
+                (pk, title, category, ingredients, description, " ".join((title, category, ingredients)))
+                for pk, title, description, category, ingredients in rows
+            ])
+            return
+        if product_ids is None:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        else:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in product_ids])
+        cursor.executemany(INSERT_SQL, rows)
+
+
+def reindex_products(product_ids=None):
+    """Обновляет строки полнотекстового индекса для товаров (или для всех)."""
+    if not is_indexed_vendor():
+        return
+
+    products = Product.objects.select_related("category").prefetch_related("ingredients__ingredient")
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    rows = [
+        (
+            product.pk,
+            normalize(product.title),
+            normalize(product.description),
+            normalize(product.category.title),
+            normalize(" ".join(item.ingredient.title for item in product.ingredients.all())),
+        )
+        for product in products
+    ]
+    _write_rows(rows, product_ids)
+
+
+def index_documents(documents):
+    """
+    Записывает в индекс уже известные тексты товаров
+    {product_id: (title, description, category, ingredients)} без повторного
+    чтения товаров из базы — для массового импорта.
+    """
+    if not is_indexed_vendor() or not documents:
+        return
+    _write_rows([(pk, *(normalize(text) for text in texts)) for pk, texts in documents.items()], list(documents))
+
+
+def remove_products(product_ids):
+    if not is_indexed_vendor():
+        return
+    _write_rows([], list(product_ids))
+
+
+def _ranked_ids_sqlite(words, loose):
+    if loose:
+        match = " OR ".join(f'"{short_prefix(word)}"*' for word in words)
+    else:
+        match = " ".join(f'"{word}"*' for word in words)
+    weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+            [match, MAX_RESULTS],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _ranked_ids_postgres(words, loose):
+    """
+    Строгий поиск — по сохранённому tsvector (GIN-индекс), запасной —
+    по триграммам pg_trgm (word_similarity, GIN gin_trgm_ops): он находит
+    и слова с опечаткой.
+    """
+    with connection.cursor() as cursor:
+        if loose:
+            text = " ".join(words)
+            cursor.execute(
+                f"SELECT product_id FROM {PG_SEARCH_TABLE} WHERE %s <%% words "
+                "ORDER BY word_similarity(%s, words) DESC LIMIT %s",
+                [text, text, MAX_RESULTS],
+            )
+        else:
+            raw = " & ".join(f"{word}:*" for word in words)
+            cursor.execute(
+                f"SELECT product_id FROM {PG_SEARCH_TABLE} WHERE document @@ to_tsquery('russian', %s) "
+                "ORDER BY ts_rank(document, to_tsquery('russian', %s)) DESC LIMIT %s",
+                [raw, raw, MAX_RESULTS],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ranked_product_ids(query):
+    """
+    Возвращает id товаров по убыванию релевантности.
+
+    Сначала ищем все слова запроса по префиксу. Если ничего не нашлось —
+    запасной поиск: на PostgreSQL по сходству триграмм (переживает
+    опечатку), на SQLite по укороченным префиксам через OR (переживает
+    другое окончание слова, но не опечатку).
+    """
+    words = tokenize(query)
+    if not words:
+        return []
+    ranked_ids = _ranked_ids_postgres if connection.vendor == "postgresql" else _ranked_ids_sqlite
+    return ranked_ids(words, loose=False) or ranked_ids(words, loose=True)
+
+
+def search_products(queryset, query):
+    ids = ranked_product_ids(query)
+    if not ids:
+        return queryset.none()
+    return (
+        queryset.filter(pk__in=ids)
+        .annotate(search_rank=Case(
+            *(When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)),
+            output_field=IntegerField(),
+        ))
+        .order_by("search_rank")
+    )
@@ -1,25 +1,84 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import *
+from .plans import PlannedListSerializer
+from .services import add_to_basket, apply_basket_operations, set_basket_item_quantity
+from .stock import StockUnavailable
+
+def requested_fields(request):
+    """Множество полей из ?fields=id,title,price или None, если параметр не передан."""
+    fields = request.query_params.get("fields") if request else None
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(",")}
+
+def is_field_requested(request, name):
+    fields = requested_fields(request)
+    return fields is None or name in fields
+
+class SparseFieldsetMixin:
+    """
+    Позволяет клиенту запросить только нужные поля: ?fields=id,title,price.
+    Работает только для сериализатора верхнего уровня, которому передан request.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        allowed = requested_fields(self.context.get("request"))
+        if allowed is not None:
+            for name in set(self.fields) - allowed:
+                self.fields.pop(name)
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "title"]
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    effective_price = serializers.DecimalField(source="get_price", max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = Product
-        fields = ["id", "title", "price", "new_price", "rating", "cover", "category"]
+        fields = [
+            "id", "title", "price", "new_price", "effective_price", "rating", "review_count", "cover", "category"
+        ]
+        # Списки товаров (каталог, бестселлеры, корзина) — по готовому плану полей
+        list_serializer_class = PlannedListSerializer
+
+class ProductIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="ingredient.id", read_only=True)
+    title = serializers.CharField(source="ingredient.title", read_only=True)
+    is_allergen = serializers.BooleanField(source="ingredient.is_allergen", read_only=True)
+
+    class Meta:
+        model = ProductIngredient
+        fields = ["id", "title", "is_allergen", "amount"]
 
 class ProductDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    effective_price = serializers.DecimalField(source="get_price", max_digits=10, decimal_places=2, read_only=True)
+    ingredients = ProductIngredientSerializer(many=True, read_only=True)
+    available_quantity = serializers.SerializerMethodField()
+    stock_band = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = "__all__"
 
+    def get_available_quantity(self, obj):
+        try:
+            return max(obj.stock.available, 0)
+        except Stock.DoesNotExist:
+            return 0
+
+    def get_stock_band(self, obj):
+        """Остаток для витрины без точного числа: out_of_stock, low или in_stock."""
+        available = self.get_available_quantity(obj)
+        if not available:
+            return "out_of_stock"
+        return "low" if available <= settings.LOW_STOCK_THRESHOLD else "in_stock"
+
 class BannerListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Banner
@@ -41,6 +100,7 @@ class BasketItemsCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = BasketItems
         fields = ["product", "quantity"]
+        extra_kwargs = {"product": {"queryset": Product.objects.select_related("pricing")}}
 
     def validate_quantity(self, value):
         if value <= 0:
@@ -49,19 +109,60 @@ class BasketItemsCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         request = self.context.get("request")
-        basket, _ = Basket.objects.get_or_create(user=request.user)
+        try:
+            return add_to_basket(request.user, validated_data["product"], validated_data["quantity"])
+        except StockUnavailable:
+            raise serializers.ValidationError({"quantity": "Недостаточно товара на складе"})
+
+class BasketOperationSerializer(BasketItemsCreateSerializer):
+    # id товара проверяется пачкой в BasketBatchSerializer, а не запросом на каждую операцию
+    product = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=["add", "set", "remove"], default="add")
+
+    class Meta(BasketItemsCreateSerializer.Meta):
+        fields = ["product", "quantity", "action"]
+
+class BasketBatchSerializer(serializers.Serializer):
+    operations = BasketOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        products = Product.objects.select_related("pricing").in_bulk({op["product"] for op in operations})
+        missing = sorted({op["product"] for op in operations} - products.keys())
+        if missing:
+            raise serializers.ValidationError(f"Товары не найдены: {missing}")
+        for op in operations:
+            op["product"] = products[op["product"]]
+        return operations
+
+    def create(self, validated_data):
+        request = self.context.get("request")
+        try:
+            return apply_basket_operations(request.user, validated_data["operations"])
+        except StockUnavailable as exc:
+            raise serializers.ValidationError({"operations": f"Недостаточно товара на складе: {exc.product_ids}"})
+
+class BasketSerializer(serializers.ModelSerializer):
+    items = BasketItemsSerializer(many=True, read_only=True)
 
-        basket_item, created = BasketItems.objects.get_or_create(
-            basket=basket,
-            product=validated_data["product"],
-            defaults={"quantity": validated_data["quantity"]}
-        )
-        if not created:
-            basket_item.quantity += validated_data["quantity"]
-            basket_item.save()
+    class Meta:
+        model = Basket
+        fields = ["id", "total_price", "items"]
+
+class BasketItemUpdateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BasketItems
+        fields = ["id", "quantity"]
+
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Количество должно быть больше 0")
+        return value
 
-        basket.update_total()
-        return basket_item
+    def update(self, instance, validated_data):
+        try:
+            return set_basket_item_quantity(instance, validated_data["quantity"])
+        except StockUnavailable:
+            raise serializers.ValidationError({"quantity": "Недостаточно товара на складе"})
 
 class CheckoutSerializer(serializers.Serializer):
     basket_id = serializers.IntegerField()
@@ -110,11 +211,12 @@ class OrderItemsNestedSerializer(serializers.ModelSerializer):
         fields = ("product", "quantity", "subtotal")
 
     def get_subtotal(self, obj):
-        return (obj.product.new_price or obj.product.price) * obj.quantity
+        return obj.line_total
 
-class OrderNestedSerializer(serializers.ModelSerializer):
+class OrderNestedSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     items = OrderItemsNestedSerializer(many=True, read_only=True)
 
     class Meta:
         model = Order
         fields = ("id", "total_price", "status", "created_at", "items")
+        list_serializer_class = PlannedListSerializer
@@ -0,0 +1,227 @@
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.http import Http404
+from django.utils import timezone
+
+from . import stock
+from .analytics import record_paid_order
+from .models import Basket, BasketItems, Order, OrderItems, Stock
+
+
+def add_to_basket(user, product, quantity):
+    """
+    Добавляет товар в корзину, резервируя его на складе, и сдвигает сумму
+    корзины на стоимость добавленного.
+    """
+    with transaction.atomic():
+        basket, _ = Basket.objects.select_for_update().get_or_create(user=user)
+        stock.reserve(user.pk, {product.id: quantity})
+        item, created = BasketItems.objects.get_or_create(
+            basket=basket, product=product,
+            defaults={"quantity": quantity}
+        )
+        if not created:
+            BasketItems.objects.filter(pk=item.pk).update(quantity=F("quantity") + quantity)
+            item.quantity += quantity
+        basket.add_to_total(product.get_price() * quantity)
+    return item
+
+
+def apply_basket_operations(user, operations):
+    """
+    Применяет список операций add/set/remove к корзине в одной транзакции.
+
+    Операции выполняются по порядку над количествами в памяти, затем
+    изменения записываются одним upsert (bulk_create с update_conflicts),
+    одним DELETE и одним сдвигом суммы корзины.
+    """
+    with transaction.atomic():
+        basket, _ = Basket.objects.select_for_update().get_or_create(user=user)
+        products = {op["product"].id: op["product"] for op in operations}
+        current = dict(
+            BasketItems.objects.filter(basket=basket, product_id__in=products).values_list("product_id", "quantity")
+        )
+
+        quantities = dict(current)
+        for op in operations:
+            product_id = op["product"].id
+            if op["action"] == "add":
+                quantities[product_id] = quantities.get(product_id, 0) + op["quantity"]
+            elif op["action"] == "set":
+                quantities[product_id] = op["quantity"]
+            else:
+                quantities[product_id] = 0
+
+        changed = {pk: qty for pk, qty in quantities.items() if qty != current.get(pk, 0)}
+        upserts = [BasketItems(basket=basket, product_id=pk, quantity=qty) for pk, qty in changed.items() if qty]
+        removed = [pk for pk, qty in changed.items() if not qty]
+
+        stock.adjust(user.pk, {pk: current.get(pk, 0) for pk in changed}, changed)
+
+        if upserts:
+            BasketItems.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=["basket", "product"],
+                update_fields=["quantity"],
+            )
+        if removed:
+            BasketItems.objects.filter(basket=basket, product_id__in=removed).delete()
+
+        delta = sum(products[pk].get_price() * (qty - current.get(pk, 0)) for pk, qty in changed.items())
+        if delta:
+            basket.add_to_total(delta)
+
+    return basket_with_items(basket.pk)
+
+
+def basket_with_items(basket_id):
+    """Корзина с позициями и товарами — для BasketSerializer без запросов на позицию."""
+    return (
+        Basket.objects.prefetch_related(
+            Prefetch("items", queryset=BasketItems.objects.select_related("product__category", "product__pricing").order_by("id"))
+        ).get(pk=basket_id)
+    )
+
+
+def reorder(user, order):
+    """
+    Копирует позиции заказа в корзину, складывая с уже лежащими там товарами.
+
+    Свободный остаток (quantity - reserved) читается одним запросом под
+    блокировкой строк склада в той же транзакции, что и резерв, поэтому
+    между расчётом и stock.reserve его никто не займёт; то, чего не
+    хватает, добавляется частично или пропускается и возвращается списком
+    unavailable. Возвращает (basket, unavailable).
+    """
+    items = list(order.items.select_related("product__pricing"))
+    product_ids = [item.product_id for item in items]
+
+    with transaction.atomic():
+        # Корзина, затем склад — тот же порядок блокировок, что в add_to_basket
+        basket, _ = Basket.objects.select_for_update().get_or_create(user=user)
+        available = dict(
+            Stock.objects.select_for_update()
+            .filter(product_id__in=product_ids)
+            .order_by("product_id")
+            .annotate(available=F("quantity") - F("reserved"))
+            .values_list("product_id", "available")
+        )
+
+        operations = []
+        unavailable = []
+        for item in items:
+            added = min(item.quantity, max(available.get(item.product_id, 0), 0))
+            if added:
+                operations.append({"product": item.product, "quantity": added, "action": "add"})
+                available[item.product_id] -= added
+            if added < item.quantity:
+                unavailable.append({
+                    "product": item.product_id,
+                    "title": item.title,
+                    "requested": item.quantity,
+                    "added": added,
+                })
+
+        if operations:
+            return apply_basket_operations(user, operations), unavailable
+    return basket_with_items(basket.pk), unavailable
+
+
+def _lock_item(item):
+    """
+    Перечитывает позицию под блокировкой (сначала корзина — тот же порядок,
+    что в add_to_basket). Дельта суммы считается от этого количества, а не
+    от переданного экземпляра: параллельный PATCH или DELETE мог его изменить.
+    """
+    Basket.objects.select_for_update().filter(pk=item.basket_id).exists()
+    return BasketItems.objects.select_for_update().filter(pk=item.pk).first()
+
+
+def set_basket_item_quantity(item, quantity):
+    with transaction.atomic():
+        locked = _lock_item(item)
+        if locked is None:
+            raise Http404
+        delta = quantity - locked.quantity
+        stock.adjust(item.basket.user_id, {item.product_id: locked.quantity}, {item.product_id: quantity})
+        item.quantity = quantity
+        item.save(update_fields=["quantity"])
+        item.basket.add_to_total(item.product.get_price() * delta)
+    return item
+
+
+def remove_basket_item(item):
+    with transaction.atomic():
+        locked = _lock_item(item)
+        if locked is None:
+            # Позицию уже удалил параллельный запрос — сумму он и поправил
+            return
+        stock.release(item.basket.user_id, {item.product_id: locked.quantity})
+        locked.delete()
+        item.basket.add_to_total(-item.product.get_price() * locked.quantity)
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def checkout_basket(user, basket_id):
+    """
+    Оформляет заказ из корзины пользователя в одной транзакции.
+
+    Число запросов не зависит от количества позиций: товары читаются одним
+    запросом, остатки списываются одним условным UPDATE (с учётом резервов
+    покупателя), позиции заказа создаются через bulk_create, корзина
+    очищается одним DELETE.
+    """
+    with transaction.atomic():
+        basket = Basket.objects.select_for_update().get(pk=basket_id, user=user)
+        items = list(basket.items.select_related("product__pricing"))
+        if not items:
+            raise CheckoutError("Корзина пуста.")
+
+        quantities = {}
+        for item in items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+        # Списываем только если остатка хватает по каждой позиции, иначе откатываем всё
+        try:
+            stock.commit(user.pk, quantities)
+        except stock.StockUnavailable:
+            raise CheckoutError("Недостаточно товара на складе.")
+
+        total = sum(item.product.get_price() * item.quantity for item in items)
+        order = Order.objects.create(user=user, total_price=total, status="Создан")
+        OrderItems.objects.bulk_create(
+            OrderItems.from_product(order, item.product, item.quantity) for item in items
+        )
+
+        BasketItems.objects.filter(basket=basket).delete()
+        Basket.objects.filter(pk=basket.pk).update(total_price=0)
+
+    return order
+
+
+def mark_order_paid(order, **fields):
+    """
+    Переводит заказ в «Оплачен» условным UPDATE, запоминает время оплаты и
+    добавляет заказ в сводки продаж за период оплаты в той же транзакции.
+    Повторная или параллельная оплата того же заказа ничего не меняет и не
+    учитывается дважды. Возвращает True, если заказ оплатил именно этот
+    вызов.
+    """
+    fields["paid_at"] = timezone.now()
+    with transaction.atomic():
+        paid = (
+            Order.objects.filter(pk=order.pk)
+            .exclude(status__in=Order.PAID_STATUSES)
+            .update(status="Оплачен", **fields)
+        )
+        if not paid:
+            return False
+        for name, value in fields.items():
+            setattr(order, name, value)
+        order.status = "Оплачен"
+        record_paid_order(order)
+    return True
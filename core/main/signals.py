@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import Banner, Category, CoffeeShop, Ingredient, Product, ProductIngredient, Promotion, Review, Stock
+from .cache import invalidate_index_payload
+from .db import apply_pragmas
+from .invalidation import invalidate_dependents, invalidate_product_details
+from .pricing import refresh_effective_prices
+from .search import reindex_products, remove_products
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=CoffeeShop)
+@receiver(post_delete, sender=CoffeeShop)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_index_payload(sender, **kwargs):
+    invalidate_index_payload()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=ProductIngredient)
+@receiver(post_delete, sender=ProductIngredient)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def reset_product_details(sender, instance, **kwargs):
+    invalidate_dependents(instance)
+
+
+@receiver(post_save, sender=Product)
+def create_product_stock(sender, instance, created, raw=False, **kwargs):
+    # Резерв и списание идут по строке склада: без неё товар нельзя ни положить в корзину, ни купить
+    if created and not raw:
+        Stock.objects.get_or_create(product=instance)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    reindex_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created, **kwargs):
+    if not created:
+        reindex_products(instance.products.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_products(sender, instance, created, **kwargs):
+    if not created:
+        reindex_products(ProductIngredient.objects.filter(ingredient=instance).values_list("product_id", flat=True))
+
+
+@receiver(post_save, sender=ProductIngredient)
+@receiver(post_delete, sender=ProductIngredient)
+def index_product_ingredients(sender, instance, **kwargs):
+    reindex_products([instance.product_id])
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    # Прежние товар и оценку берём из базы при сохранении, а не при каждой загрузке
+    # отзыва: списки и .only()/.defer() не платят лишним запросом на строку
+    instance._rated = (
+        Review.objects.filter(pk=instance.pk).values_list("product_id", "rating").first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    previous = None if created else instance._rated
+    if previous is None:
+        Product.apply_review_delta(instance.product_id, 1, instance.rating)
+    elif previous[0] != instance.product_id:
+        Product.apply_review_delta(previous[0], -1, -previous[1])
+        Product.apply_review_delta(instance.product_id, 1, instance.rating)
+    elif previous[1] != instance.rating:
+        Product.apply_review_delta(instance.product_id, 0, instance.rating - previous[1])
+    else:
+        return
+    invalidate_product_details({instance.product_id, previous and previous[0]} - {None})
+    invalidate_index_payload()
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    Product.apply_review_delta(instance.product_id, -1, -instance.rating)
+    invalidate_product_details([instance.product_id])
+    invalidate_index_payload()
+
+
+@receiver(post_save, sender=Product)
+def price_product(sender, instance, **kwargs):
+    refresh_effective_prices([instance.pk])
+
+
+@receiver(post_save, sender=Promotion)
+def price_promotion_products(sender, instance, **kwargs):
+    refresh_effective_prices(instance.products.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Promotion)
+def remember_promotion_products(sender, instance, **kwargs):
+    instance._product_ids = list(instance.products.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Promotion)
+def reprice_after_promotion_delete(sender, instance, **kwargs):
+    refresh_effective_prices(instance._product_ids)
+
+
+@receiver(m2m_changed, sender=Promotion.products.through)
+def price_promotion_links(sender, instance, action, pk_set, reverse, **kwargs):
+    if reverse:
+        # Со стороны товара: product.promotion_set.add(...)
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_effective_prices([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_ids = list(instance.products.values_list("pk", flat=True))
+    elif action == "post_clear":
+        refresh_effective_prices(instance._cleared_ids)
+    elif action in ("post_add", "post_remove"):
+        refresh_effective_prices(pk_set)
@@ -0,0 +1,165 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from .invalidation import invalidate_product_details
+from .models import Stock, StockReservation
+
+
+# Порядок блокировок во всех функциях: сначала резервы пользователя
+# (StockReservation, select_for_update), затем остатки (Stock). Иначе
+# reserve и, например, release_expired для того же товара ждут друг друга,
+# и PostgreSQL обрывает одну из транзакций по взаимоблокировке.
+
+
+class StockUnavailable(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Недостаточно товара на складе: {self.product_ids}")
+
+
+def _shift(field, deltas):
+    return Case(*(When(product_id=pk, then=F(field) + delta) for pk, delta in deltas.items()))
+
+
+def _unavailable(quantities):
+    """Какие товары не проходят проверку остатка — для сообщения об ошибке."""
+    available = dict(
+        Stock.objects.filter(product_id__in=quantities)
+        .annotate(available=F("quantity") - F("reserved"))
+        .values_list("product_id", "available")
+    )
+    return [pk for pk, qty in quantities.items() if available.get(pk, 0) < qty]
+
+
+def _save_holds(user_id, holds):
+    """Записывает итоговые количества резервов пользователя: upsert для > 0, удаление для 0."""
+    expires_at = timezone.now() + settings.STOCK_RESERVATION_TTL
+    kept = [
+        StockReservation(user_id=user_id, product_id=pk, quantity=qty, expires_at=expires_at)
+        for pk, qty in holds.items() if qty
+    ]
+    if kept:
+        StockReservation.objects.bulk_create(
+            kept,
+            update_conflicts=True,
+            unique_fields=["user", "product"],
+            update_fields=["quantity", "expires_at"],
+        )
+    dropped = [pk for pk, qty in holds.items() if not qty]
+    if dropped:
+        StockReservation.objects.filter(user_id=user_id, product_id__in=dropped).delete()
+
+
+def reserve(user_id, quantities):
+    """
+    Резервирует товары {product_id: количество} за пользователем на
+    STOCK_RESERVATION_TTL. Всё или ничего: остатки проверяются и
+    резервируются одним условным UPDATE (quantity - reserved >= n).
+    """
+    quantities = {pk: qty for pk, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+    with transaction.atomic(savepoint=False):
+        holds = dict(
+            StockReservation.objects.select_for_update()
+            .filter(user_id=user_id, product_id__in=quantities)
+            .values_list("product_id", "quantity")
+        )
+        held = Stock.objects.filter(
+            reduce(or_, (Q(product_id=pk, quantity__gte=F("reserved") + qty) for pk, qty in quantities.items()))
+        ).update(reserved=_shift("reserved", quantities), updated_at=timezone.now())
+        if held != len(quantities):
+            raise StockUnavailable(_unavailable(quantities))
+        invalidate_product_details(quantities)
+        _save_holds(user_id, {pk: holds.get(pk, 0) + qty for pk, qty in quantities.items()})
+
+
+def release(user_id, quantities):
+    """Снимает резерв (не больше, чем реально удерживается пользователем)."""
+    quantities = {pk: qty for pk, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+    with transaction.atomic(savepoint=False):
+        holds = dict(
+            StockReservation.objects.select_for_update()
+            .filter(user_id=user_id, product_id__in=quantities)
+            .values_list("product_id", "quantity")
+        )
+        released = {pk: min(qty, holds[pk]) for pk, qty in quantities.items() if pk in holds}
+        if not released:
+            return
+        Stock.objects.filter(product_id__in=released).update(
+            reserved=_shift("reserved", {pk: -qty for pk, qty in released.items()}),
+            updated_at=timezone.now(),
+        )
+        invalidate_product_details(released)
+        _save_holds(user_id, {pk: holds[pk] - qty for pk, qty in released.items()})
+
+
+def adjust(user_id, old_quantities, new_quantities):
+    """Приводит резервы к новым количествам в корзине."""
+    product_ids = set(old_quantities) | set(new_quantities)
+    deltas = {pk: new_quantities.get(pk, 0) - old_quantities.get(pk, 0) for pk in product_ids}
+    release(user_id, {pk: -delta for pk, delta in deltas.items() if delta < 0})
+    reserve(user_id, {pk: delta for pk, delta in deltas.items() if delta > 0})
+
+
+def commit(user_id, quantities):
+    """
+    Списывает товары при оформлении заказа, превращая резервы пользователя
+    в продажу. Истёкший и уже снятый резерв не мешает: достаточно, чтобы
+    свободного остатка плюс собственного резерва хватало на заказ.
+    """
+    with transaction.atomic(savepoint=False):
+        holds = dict(
+            StockReservation.objects.select_for_update()
+            .filter(user_id=user_id, product_id__in=quantities)
+            .values_list("product_id", "quantity")
+        )
+        updated = Stock.objects.filter(
+            reduce(or_, (
+                Q(product_id=pk, quantity__gte=F("reserved") - holds.get(pk, 0) + qty)
+                for pk, qty in quantities.items()
+            ))
+        ).update(
+            quantity=_shift("quantity", {pk: -qty for pk, qty in quantities.items()}),
+            reserved=_shift("reserved", {pk: -holds.get(pk, 0) for pk in quantities}),
+            updated_at=timezone.now(),
+        )
+        if updated != len(quantities):
+            raise StockUnavailable([])
+        invalidate_product_details(quantities)
+        if holds:
+            StockReservation.objects.filter(user_id=user_id, product_id__in=holds).delete()
+
+
+def release_expired(now=None, batch_size=1000):
+    """
+    Возвращает на склад истёкшие резервы пачками: на пачку — одно чтение,
+    один UPDATE остатков и один DELETE. Возвращает число снятых резервов.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic(savepoint=False):
+            expired = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .values_list("id", "product_id", "quantity")[:batch_size]
+            )
+            if not expired:
+                return released
+            totals = {}
+            for _, product_id, quantity in expired:
+                totals[product_id] = totals.get(product_id, 0) - quantity
+            Stock.objects.filter(product_id__in=totals).update(
+                reserved=_shift("reserved", totals), updated_at=timezone.now()
+            )
+            invalidate_product_details(totals)
+            StockReservation.objects.filter(id__in=[row[0] for row in expired]).delete()
+        released += len(expired)
@@ -1,3 +1,1471 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _lazy
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from core.routers import PrimaryReplicaRouter, release_primary
+from user.models import User
+from .models import (
+    Basket, BasketItems, BestSeller, Category, Ingredient, Order, OrderItems, Product, ProductIngredient, ProductPrice, Promotion,
+    CategorySalesRollup, PaymentSalesRollup, ProductSalesRollup, ProductSalesWindow, Review, Stock, StockReservation,
+)
+from . import stock
+from .analytics import bucket_start
+from .bestsellers import advance_window, materialize
+from .cache import get_index_payload
+from .catalog import CatalogImporter
+from .db import apply_pragmas
+from .invalidation import PRODUCT_VERSION_KEY
+from .plans import PlannedListSerializer
+from . import renderers
+from .scheduler import PromotionScheduler, boundary
+from .serializers import OrderNestedSerializer, ProductListSerializer
+from .services import CheckoutError, add_to_basket, checkout_basket, remove_basket_item, set_basket_item_quantity
+
+
+class IndexPayloadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(title="Кофе")
+        Product.objects.create(category=self.category, title="Латте", price=Decimal("180.00"), is_best_seller=True)
+
+    def test_steady_state_hits_no_database(self):
+        self.client.get(reverse("index"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["best_sellers"][0]["title"], "Латте")
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(reverse("index"))["ETag"]
+        response = self.client.get(reverse("index"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_admin_changes_invalidate_payload(self):
+        etag = self.client.get(reverse("index"))["ETag"]
+        Category.objects.create(title="Десерты")
+        response = self.client.get(reverse("index"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["categories"]), 2)
+
+    def test_rebuild_before_commit_is_discarded(self):
+        stale = self.client.get(reverse("index")).data
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Category.objects.create(title="Десерты")
+            # Параллельный запрос собрал главную по строкам до COMMIT
+            with mock.patch("main.cache.build_index_payload", return_value=stale):
+                get_index_payload()
+        self.assertEqual(len(self.client.get(reverse("index")).data["categories"]), 2)
+
+
+class EndpointQueryCountTests(APITestCase):
+    """
+    Количество запросов каждого эндпоинта не должно зависеть от числа строк.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(title="Кофе")
+        self.basket = Basket.objects.create(user=self.user)
+
+    def add_rows(self, count):
+        for i in range(count):
+            product = Product.objects.create(category=self.category, title=f"Кофе {i}", price=Decimal("100.00"))
+            BasketItems.objects.create(basket=self.basket, product=product, quantity=2)
+            order = Order.objects.create(user=self.user, total_price=Decimal("500.00"))
+            for _ in range(5):
+                OrderItems.objects.create(order=order, product=product, quantity=1)
+
+    def assert_constant_queries(self, url, num):
+        for count in (1, 10):
+            self.add_rows(count)
+            with self.assertNumQueries(num):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_product_list(self):
+        # Агрегат валидаторов (ETag/Last-Modified) и сама страница
+        self.assert_constant_queries(reverse("product_list"), 2)
+
+    def test_basket_items(self):
+        self.assert_constant_queries(reverse("basket_items_list"), 1)
+
+    def test_order_list(self):
+        self.assert_constant_queries(reverse("order_list"), 2)
+
+    def test_order_detail(self):
+        self.add_rows(3)
+        order = Order.objects.filter(user=self.user).first()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("order_detail", args=[order.id]))
+        self.assertEqual(len(response.data["items"]), 5)
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(title="Кофе")
+        self.basket = Basket.objects.create(user=self.user)
+
+    def add_item(self, quantity, stock=10, new_price=None):
+        product = Product.objects.create(
+            category=self.category, title="Раф", price=Decimal("200.00"), new_price=new_price
+        )
+        Stock.objects.update_or_create(product=product, defaults={"quantity": stock})
+        BasketItems.objects.create(basket=self.basket, product=product, quantity=quantity)
+        return product
+
+    def checkout(self):
+        return self.client.post(reverse("checkout"), {"basket_id": self.basket.id})
+
+    def test_creates_order_and_decrements_stock(self):
+        first = self.add_item(2)
+        second = self.add_item(1, new_price=Decimal("150.00"))
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.total_price, Decimal("550.00"))
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(Stock.objects.get(product=first).quantity, 8)
+        self.assertEqual(Stock.objects.get(product=second).quantity, 9)
+        self.assertFalse(BasketItems.objects.filter(basket=self.basket).exists())
+
+    def test_query_count_does_not_grow_with_basket(self):
+        for _ in range(10):
+            self.add_item(1)
+        with self.assertNumQueries(10):
+            self.assertEqual(self.checkout().status_code, 201)
+
+    def test_oversell_rolls_back(self):
+        enough = self.add_item(1)
+        short = self.add_item(5, stock=2)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Stock.objects.get(product=enough).quantity, 10)
+        self.assertEqual(Stock.objects.get(product=short).quantity, 2)
+        self.assertEqual(BasketItems.objects.filter(basket=self.basket).count(), 2)
+
+    def test_order_history_keeps_checkout_prices(self):
+        product = self.add_item(2, new_price=Decimal("150.00"))
+        self.checkout()
+        Product.objects.filter(pk=product.pk).update(price=Decimal("999.00"), new_price=None)
+        order = Order.objects.get(user=self.user)
+
+        item = self.client.get(reverse("order_detail", args=[order.id])).data["items"][0]
+        self.assertEqual(item["subtotal"], Decimal("300.00"))
+
+        with self.assertNumQueries(2):
+            receipt = self.client.get(reverse("order_receipt", args=[order.id])).data
+        self.assertEqual(receipt["items"][0]["price"], 150.0)
+        self.assertEqual(receipt["payment_summary"]["total"], 300.0)
+
+    def test_foreign_basket_is_not_found(self):
+        other = User.objects.create_user(email="other@example.com", password="pass12345")
+        self.basket = Basket.objects.create(user=other)
+        self.assertEqual(self.checkout().status_code, 404)
+
+
+class BasketTotalTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(title="Кофе")
+        self.latte = Product.objects.create(category=self.category, title="Латте", price=Decimal("180.00"))
+        self.mocha = Product.objects.create(
+            category=self.category, title="Мокко", price=Decimal("220.00"), new_price=Decimal("200.00")
+        )
+        Stock.objects.update_or_create(product=self.latte, defaults={"quantity": 50})
+        Stock.objects.update_or_create(product=self.mocha, defaults={"quantity": 50})
+
+    def add(self, product, quantity):
+        return self.client.post(reverse("basket_items_create"), {"product": product.id, "quantity": quantity})
+
+    def total(self):
+        return Basket.objects.get(user=self.user).total_price
+
+    def test_mutations_keep_total_in_sync(self):
+        self.add(self.latte, 2)
+        self.add(self.mocha, 1)
+        self.add(self.latte, 1)
+        self.assertEqual(self.total(), Decimal("740.00"))
+
+        item = BasketItems.objects.get(basket__user=self.user, product=self.mocha)
+        self.client.patch(reverse("basket_item_delete", args=[item.id]), {"quantity": 3})
+        self.assertEqual(self.total(), Decimal("1140.00"))
+
+        self.client.delete(reverse("basket_item_delete", args=[item.id]))
+        self.assertEqual(self.total(), Decimal("540.00"))
+
+    def test_add_cost_does_not_grow_with_basket(self):
+        for i in range(10):
+            product = Product.objects.create(category=self.category, title=f"Кофе {i}", price=Decimal("100.00"))
+            Stock.objects.update_or_create(product=product, defaults={"quantity": 5})
+            self.add(product, 1)
+        with self.assertNumQueries(12):
+            self.assertEqual(self.add(self.latte, 1).status_code, 201)
+
+    def test_reconcile_fixes_drifted_totals(self):
+        self.add(self.latte, 2)
+        self.latte.price = Decimal("200.00")
+        self.latte.save()
+
+        out = StringIO()
+        call_command("reconcile_basket_totals", dry_run=True, stdout=out)
+        self.assertIn("Найдено расхождений: 1", out.getvalue())
+        self.assertEqual(self.total(), Decimal("360.00"))
+
+        call_command("reconcile_basket_totals", stdout=out)
+        self.assertIn("Исправлено корзин: 1", out.getvalue())
+        self.assertEqual(self.total(), Decimal("400.00"))
+
+
+class BasketBatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(title="Кофе")
+        self.products = [
+            Product.objects.create(category=category, title=f"Кофе {i}", price=Decimal("100.00")) for i in range(3)
+        ]
+        Stock.objects.filter(product__in=self.products).update(quantity=10)
+        self.client.post(reverse("basket_items_create"), {"product": self.products[0].id, "quantity": 2})
+        self.client.post(reverse("basket_items_create"), {"product": self.products[1].id, "quantity": 1})
+
+    def batch(self, operations):
+        return self.client.post(reverse("basket_items_batch"), {"operations": operations}, format="json")
+
+    def test_applies_operations_in_order(self):
+        first, second, third = self.products
+        response = self.batch([
+            {"product": first.id, "quantity": 1, "action": "add"},
+            {"product": second.id, "action": "remove"},
+            {"product": third.id, "quantity": 4, "action": "set"},
+            {"product": third.id, "quantity": 1},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        quantities = {item["product"]["id"]: item["quantity"] for item in response.data["items"]}
+        self.assertEqual(quantities, {first.id: 3, third.id: 5})
+        self.assertEqual(response.data["total_price"], "800.00")
+
+    def test_unknown_product_changes_nothing(self):
+        response = self.batch([
+            {"product": self.products[2].id, "quantity": 1},
+            {"product": 999, "quantity": 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(BasketItems.objects.filter(basket__user=self.user).count(), 2)
+
+    def test_query_count_does_not_grow_with_operations(self):
+        operations = [{"product": product.id, "quantity": 2, "action": "set"} for product in self.products]
+        with self.assertNumQueries(12):
+            self.assertEqual(self.batch(operations).status_code, 200)
+
+
+class ReorderTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(title="Кофе")
+        self.order = Order.objects.create(user=self.user, total_price=Decimal("0.00"))
+        self.products = []
+        for i, stock in enumerate([10, 10, 1]):
+            product = Product.objects.create(category=category, title=f"Кофе {i}", price=Decimal("100.00"))
+            Stock.objects.update_or_create(product=product, defaults={"quantity": stock})
+            OrderItems.objects.create(
+                order=self.order, product=product, quantity=2, title=product.title,
+                price=product.price, line_total=product.price * 2
+            )
+            self.products.append(product)
+
+    def test_merges_into_basket_and_reports_shortage(self):
+        self.client.post(reverse("basket_items_create"), {"product": self.products[0].id, "quantity": 1})
+
+        response = self.client.post(reverse("order_reorder", args=[self.order.id]))
+
+        self.assertEqual(response.status_code, 200)
+        quantities = {item["product"]["id"]: item["quantity"] for item in response.data["basket"]["items"]}
+        self.assertEqual(quantities, {self.products[0].id: 3, self.products[1].id: 2, self.products[2].id: 1})
+        self.assertEqual(response.data["basket"]["total_price"], "600.00")
+        self.assertEqual(response.data["unavailable"], [
+            {"product": self.products[2].id, "title": "Кофе 2", "requested": 2, "added": 1},
+        ])
+
+    def test_query_count_does_not_grow_with_order(self):
+        self.client.post(reverse("basket_items_create"), {"product": self.products[0].id, "quantity": 1})
+        with self.assertNumQueries(17):
+            self.client.post(reverse("order_reorder", args=[self.order.id]))
+
+    def test_nothing_available_returns_prefetched_basket(self):
+        for product in self.products:
+            self.client.post(reverse("basket_items_create"), {"product": product.id, "quantity": 1})
+        Stock.objects.update(reserved=F("quantity"))
+
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse("order_reorder", args=[self.order.id]))
+        self.assertEqual(len(response.data["basket"]["items"]), 3)
+        self.assertEqual(len(response.data["unavailable"]), 3)
+
+    def test_foreign_order_is_not_found(self):
+        other = User.objects.create_user(email="other@example.com", password="pass12345")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.post(reverse("order_reorder", args=[self.order.id])).status_code, 404)
+
+
+class StockReservationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(title="Кофе")
+        self.product = Product.objects.create(category=category, title="Латте", price=Decimal("180.00"))
+        self.stock = Stock.objects.update_or_create(product=self.product, defaults={"quantity": 3})[0]
+
+    def add(self, quantity):
+        return self.client.post(reverse("basket_items_create"), {"product": self.product.id, "quantity": quantity})
+
+    def test_new_products_get_stock_row(self):
+        product = Product.objects.create(category=self.product.category, title="Раф", price=Decimal("200.00"))
+        self.assertEqual((product.stock.quantity, product.stock.reserved), (0, 0))
+        self.assertEqual(self.client.post(
+            reverse("basket_items_create"), {"product": product.id, "quantity": 1}
+        ).status_code, 400)
+
+    def test_basket_holds_stock_until_removed(self):
+        self.assertEqual(self.add(2).status_code, 201)
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.quantity, self.stock.reserved), (3, 2))
+
+        response = self.add(2)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(BasketItems.objects.get(basket__user=self.user).quantity, 2)
+        detail = self.client.get(reverse("product_detail", args=[self.product.id])).data
+        self.assertEqual(detail["available_quantity"], 1)
+
+        item = BasketItems.objects.get(basket__user=self.user)
+        self.client.delete(reverse("basket_item_delete", args=[item.id]))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_other_user_cannot_take_held_stock(self):
+        self.add(3)
+        other = User.objects.create_user(email="other@example.com", password="pass12345")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.add(1).status_code, 400)
+
+    def test_checkout_consumes_own_hold(self):
+        self.add(3)
+        basket = Basket.objects.get(user=self.user)
+        self.assertEqual(self.client.post(reverse("checkout"), {"basket_id": basket.id}).status_code, 201)
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.quantity, self.stock.reserved), (0, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_holds_are_released(self):
+        self.add(2)
+        StockReservation.objects.update(expires_at=timezone.now() - datetime.timedelta(minutes=1))
+
+        call_command("release_expired_reservations", stdout=StringIO())
+
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+        # Корзина остаётся, а оформить её можно, пока остатка хватает
+        basket = Basket.objects.get(user=self.user)
+        self.assertEqual(self.client.post(reverse("checkout"), {"basket_id": basket.id}).status_code, 201)
+
+    def test_every_path_locks_reservations_before_stock(self):
+        def locked_tables(operation, *args):
+            with CaptureQueriesContext(connection) as queries:
+                operation(*args)
+            return [
+                "reservation" if "main_stockreservation" in query["sql"] else "stock"
+                for query in queries.captured_queries
+                if re.match(r"(SELECT|UPDATE)", query["sql"]) and "main_stock" in query["sql"]
+            ][:2]
+
+        self.add(1)
+        self.assertEqual(locked_tables(stock.reserve, self.user.pk, {self.product.pk: 1}), ["reservation", "stock"])
+        self.assertEqual(locked_tables(stock.release, self.user.pk, {self.product.pk: 1}), ["reservation", "stock"])
+        StockReservation.objects.update(expires_at=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertEqual(locked_tables(stock.release_expired), ["reservation", "stock"])
+
+
+class StockReservationConcurrencyTests(TransactionTestCase):
+    def test_parallel_reservations_never_oversell(self):
+        category = Category.objects.create(title="Кофе")
+        product = Product.objects.create(category=category, title="Латте", price=Decimal("180.00"))
+        Stock.objects.update_or_create(product=product, defaults={"quantity": 5})
+        users = [User.objects.create_user(email=f"guest{i}@example.com", password="pass12345") for i in range(12)]
+        results = []
+
+        def attempt(user):
+            try:
+                for _ in range(50):
+                    try:
+                        with transaction.atomic():
+                            stock.reserve(user.pk, {product.pk: 1})
+                        results.append(True)
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+            except stock.StockUnavailable:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        current = Stock.objects.get(product=product)
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(current.reserved, 5)
+        self.assertEqual(StockReservation.objects.count(), 5)
+
+    def test_parallel_checkouts_never_oversell(self):
+        category = Category.objects.create(title="Кофе")
+        product = Product.objects.create(category=category, title="Латте", price=Decimal("180.00"))
+        Stock.objects.filter(product=product).update(quantity=5)
+        # Резервы истекли и сняты: остаток делят только условные UPDATE при оформлении
+        baskets = []
+        for i in range(12):
+            user = User.objects.create_user(email=f"guest{i}@example.com", password="pass12345")
+            basket = Basket.objects.create(user=user)
+            BasketItems.objects.create(basket=basket, product=product, quantity=1)
+            baskets.append((user, basket.pk))
+        results = []
+
+        def attempt(user, basket_id):
+            try:
+                for _ in range(50):
+                    try:
+                        checkout_basket(user, basket_id)
+                        results.append(True)
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+            except CheckoutError:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=pair) for pair in baskets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        current = Stock.objects.get(product=product)
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual((current.quantity, current.reserved), (0, 0))
+        self.assertEqual(Order.objects.count(), 5)
+
+
+class BasketItemConcurrencyTests(TransactionTestCase):
+    def test_parallel_updates_keep_total_in_sync(self):
+        category = Category.objects.create(title="Кофе")
+        product = Product.objects.create(category=category, title="Латте", price=Decimal("100.00"))
+        Stock.objects.update_or_create(product=product, defaults={"quantity": 50})
+        user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        add_to_basket(user, product, 2)
+        # Оба запроса успели прочитать позицию с количеством 2 до изменений
+        stale = [BasketItems.objects.select_related("basket", "product__pricing").get() for _ in range(2)]
+        operations = [lambda item: set_basket_item_quantity(item, 5), lambda item: set_basket_item_quantity(item, 4)]
+        barrier = threading.Barrier(len(operations))
+
+        def attempt(operation, item):
+            barrier.wait()
+            try:
+                for _ in range(50):
+                    try:
+                        operation(item)
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=pair) for pair in zip(operations, stale)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        quantity = BasketItems.objects.get().quantity
+        self.assertIn(quantity, (4, 5))
+        self.assertEqual(Basket.objects.get(user=user).total_price, Decimal("100.00") * quantity)
+        self.assertEqual(Stock.objects.get(product=product).reserved, quantity)
+
+        # Устаревший экземпляр при удалении: сумма уменьшается на реальное количество
+        remove_basket_item(stale[0])
+        self.assertEqual(Basket.objects.get(user=user).total_price, 0)
+        self.assertEqual(Stock.objects.get(product=product).reserved, 0)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        coffee = Category.objects.create(title="Кофе")
+        desserts = Category.objects.create(title="Десерты")
+        self.cappuccino = Product.objects.create(category=coffee, title="Капучино", price=Decimal("190.00"))
+        self.latte = Product.objects.create(
+            category=coffee, title="Латте", description="Мягче, чем капучино", price=Decimal("180.00")
+        )
+        self.cake = Product.objects.create(category=desserts, title="Медовик", price=Decimal("250.00"))
+        honey = Ingredient.objects.create(title="Мёд")
+        ProductIngredient.objects.create(product=self.cake, ingredient=honey)
+
+    def search(self, query):
+        response = self.client.get(reverse("product_list"), {"search": query})
+        return [product["id"] for product in response.data["results"]]
+
+    def test_title_match_ranks_above_description(self):
+        self.assertEqual(self.search("капучино"), [self.cappuccino.id, self.latte.id])
+
+    def test_ranked_results_page_by_relevance(self):
+        response = self.client.get(reverse("product_list"), {"search": "капучино", "page_size": 1})
+        second = self.client.get(response.data["next"])
+        self.assertEqual(response.data["results"][0]["id"], self.cappuccino.id)
+        self.assertEqual([row["id"] for row in second.data["results"]], [self.latte.id])
+
+    def test_prefix_and_case_insensitive(self):
+        self.assertEqual(self.search("КАПУЧ"), [self.cappuccino.id, self.latte.id])
+
+    def test_typo_tolerant(self):
+        self.assertIn(self.cappuccino.id, self.search("капучена"))
+
+    def test_searches_category_and_ingredients(self):
+        self.assertEqual(self.search("мед"), [self.cake.id])
+        self.assertEqual(self.search("десерты"), [self.cake.id])
+
+    def test_index_follows_changes(self):
+        self.cake.title = "Наполеон"
+        self.cake.save()
+        self.assertEqual(self.search("наполеон"), [self.cake.id])
+        self.cake.delete()
+        self.assertEqual(self.search("наполеон"), [])
+
+
+class ListPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(title="Кофе")
+        self.products = [
+            Product.objects.create(category=category, title=f"Кофе {i}", price=Decimal("100.00")) for i in range(5)
+        ]
+        for product in self.products:
+            order = Order.objects.create(user=self.user, total_price=Decimal("100.00"))
+            OrderItems.objects.create(order=order, product=product, line_total=Decimal("100.00"))
+
+    def collect(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            ids += [row["id"] for row in response.data["results"]]
+            if not response.data["next"]:
+                return ids
+            response = self.client.get(response.data["next"])
+
+    def test_products_walk_by_cursor(self):
+        ids = self.collect(reverse("product_list"), {"page_size": 2})
+        self.assertEqual(ids, [product.id for product in self.products])
+
+    def test_products_walk_by_non_unique_ordering(self):
+        # Цены у всех товаров равны: порядок задаёт только id
+        ids = sorted(product.id for product in self.products)
+        self.assertEqual(self.collect(reverse("product_list"), {"page_size": 2, "ordering": "price"}), ids)
+        self.assertEqual(self.collect(reverse("product_list"), {"page_size": 2, "ordering": "-price"}), ids[::-1])
+
+    def test_orders_walk_newest_first(self):
+        ids = self.collect(reverse("order_list"), {"page_size": 2})
+        self.assertEqual(ids, sorted(Order.objects.values_list("id", flat=True), reverse=True))
+
+    def test_sparse_fieldsets_skip_nested_data(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("order_list"), {"fields": "id,total_price"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "total_price"})
+
+        response = self.client.get(reverse("product_list"), {"fields": "id,title"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "title"})
+
+
+class ProductRatingTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(title="Кофе")
+        self.latte = Product.objects.create(category=category, title="Латте", price=Decimal("180.00"))
+        self.mocha = Product.objects.create(category=category, title="Мокко", price=Decimal("200.00"))
+
+    def assert_stats(self, product, rating, count):
+        product.refresh_from_db()
+        self.assertEqual((product.rating, product.review_count), (Decimal(rating), count))
+
+    def test_reviews_update_aggregates_incrementally(self):
+        first = Review.objects.create(product=self.latte, rating=5)
+        Review.objects.create(product=self.latte, rating=4)
+        Review.objects.create(product=self.latte, rating=4)
+        self.assert_stats(self.latte, "4.3", 3)
+
+        first.rating = 2
+        first.save()
+        self.assert_stats(self.latte, "3.3", 3)
+
+        first.product = self.mocha
+        first.save()
+        self.assert_stats(self.latte, "4.0", 2)
+        self.assert_stats(self.mocha, "2.0", 1)
+
+        first.delete()
+        self.assert_stats(self.mocha, "0.0", 0)
+
+    def test_loading_reviews_costs_no_extra_queries(self):
+        for rating in (3, 4, 5):
+            Review.objects.create(product=self.latte, rating=rating)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(Review.objects.only("id"))), 3)
+
+        # Экземпляр, загруженный до чужого изменения, считается от строки в базе
+        stale = Review.objects.get(rating=5)
+        Review.objects.filter(pk=stale.pk).update(rating=1)
+        Product.apply_review_delta(self.latte.pk, 0, -4)
+        stale.rating = 2
+        stale.save()
+        self.assert_stats(self.latte, "3.0", 3)
+
+    def test_recompute_command_fixes_drift(self):
+        Review.objects.create(product=self.latte, rating=3)
+        Product.objects.filter(pk=self.latte.pk).update(rating=Decimal("1.0"), review_count=7)
+
+        call_command("recompute_product_ratings", stdout=StringIO())
+
+        self.assert_stats(self.latte, "3.0", 1)
+
+    def test_order_and_filter_by_rating(self):
+        Review.objects.create(product=self.latte, rating=3)
+        Review.objects.create(product=self.mocha, rating=5)
+        Review.objects.create(product=self.mocha, rating=5)
+
+        response = self.client.get(reverse("product_list"), {"ordering": "-rating"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.mocha.id, self.latte.id])
+
+        response = self.client.get(reverse("product_list"), {"min_reviews": 2})
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.mocha.id])
+
+
+class PricingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(title="Кофе")
+        self.latte = Product.objects.create(category=category, title="Латте", price=Decimal("200.00"))
+        self.mocha = Product.objects.create(
+            category=category, title="Мокко", price=Decimal("200.00"), new_price=Decimal("150.00")
+        )
+        Stock.objects.update_or_create(product=self.latte, defaults={"quantity": 10})
+        today = timezone.localdate()
+        self.promotion = Promotion.objects.create(
+            title="Утро", discount_percent=10, start_date=today, end_date=today + datetime.timedelta(days=3)
+        )
+
+    def price_of(self, product):
+        return Product.objects.select_related("pricing").get(pk=product.pk).get_price()
+
+    def test_best_single_promotion_applies(self):
+        self.promotion.products.add(self.latte, self.mocha)
+        self.assertEqual(self.price_of(self.latte), Decimal("180.00"))
+        # Цена со скидкой ниже акционной — акция не суммируется с ней
+        self.assertEqual(self.price_of(self.mocha), Decimal("150.00"))
+
+        bigger = Promotion.objects.create(
+            title="Вечер", discount_percent=30, start_date=self.promotion.start_date, end_date=self.promotion.end_date
+        )
+        bigger.products.add(self.mocha, self.latte)
+        self.assertEqual(self.price_of(self.latte), Decimal("140.00"))
+        self.assertEqual(self.price_of(self.mocha), Decimal("140.00"))
+
+        bigger.delete()
+        self.assertEqual(self.price_of(self.latte), Decimal("180.00"))
+
+    def test_inactive_promotion_is_ignored(self):
+        self.promotion.products.add(self.latte)
+        self.promotion.start_date += datetime.timedelta(days=1)
+        self.promotion.save()
+        self.assertEqual(self.price_of(self.latte), Decimal("200.00"))
+
+    def test_read_paths_use_effective_price(self):
+        self.promotion.products.add(self.latte)
+
+        listed = self.client.get(reverse("product_list")).data["results"]
+        self.assertEqual({row["id"]: row["effective_price"] for row in listed}[self.latte.id], "180.00")
+
+        self.client.post(reverse("basket_items_create"), {"product": self.latte.id, "quantity": 2})
+        self.assertEqual(Basket.objects.get(user=self.user).total_price, Decimal("360.00"))
+
+        self.client.post(reverse("checkout"), {"basket_id": Basket.objects.get(user=self.user).id})
+        order = Order.objects.get(user=self.user)
+        receipt = self.client.get(reverse("order_receipt", args=[order.id])).data
+        self.assertEqual(receipt["items"][0]["price"], 180.0)
+        self.assertEqual(order.items.get().discount, Decimal("20.00"))
+
+
+class PromotionSchedulerTests(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(title="Кофе")
+        self.latte = Product.objects.create(category=category, title="Латте", price=Decimal("200.00"))
+        self.today = timezone.localdate()
+        self.promotion = Promotion.objects.create(
+            title="Завтра", discount_percent=50,
+            start_date=self.today + datetime.timedelta(days=1), end_date=self.today + datetime.timedelta(days=1),
+        )
+        self.promotion.products.add(self.latte)
+
+    def price(self):
+        return ProductPrice.objects.get(product=self.latte).price
+
+    def test_switches_prices_at_boundaries(self):
+        scheduler = PromotionScheduler()
+        scheduler.load(timezone.now())
+        start = boundary(self.today + datetime.timedelta(days=1))
+        self.assertEqual(scheduler.next_boundary(), start)
+        self.assertEqual(self.price(), Decimal("200.00"))
+
+        self.assertEqual(scheduler.run_due(start), 1)
+        self.assertEqual(self.price(), Decimal("100.00"))
+
+        end = boundary(self.today + datetime.timedelta(days=2))
+        self.assertEqual(scheduler.run_due(end - datetime.timedelta(seconds=1)), 0)
+        self.assertEqual(scheduler.run_due(end), 1)
+        self.assertEqual(self.price(), Decimal("200.00"))
+        self.assertIsNone(scheduler.next_boundary())
+
+    def test_reload_does_not_duplicate_boundaries(self):
+        scheduler = PromotionScheduler()
+        scheduler.load(timezone.now())
+        scheduler.load(timezone.now())
+        self.assertEqual(len(scheduler.heap), 2)
+
+
+class CatalogImportExportTests(APITestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def write_feed(self, name, rows):
+        with open(self.path(name), "w", encoding="utf-8") as feed:
+            for row in rows:
+                feed.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return self.path(name)
+
+    def row(self, sku, **extra):
+        return {
+            "sku": sku, "title": f"Кофе {sku}", "category": "Кофе", "price": "100.00", "stock": 5,
+            "ingredients": [{"title": "Молоко", "amount": "150 мл", "is_allergen": True}],
+            **extra,
+        }
+
+    def test_upserts_catalog_and_keeps_reservations(self):
+        call_command("import_catalog", self.write_feed("first.jsonl", [self.row("A1"), self.row("A2")]), stdout=StringIO())
+        product = Product.objects.get(sku="A1")
+        Stock.objects.filter(product=product).update(reserved=2)
+
+        feed = self.write_feed("second.jsonl", [
+            self.row("A1", price="120.00", stock=8, ingredients=[{"title": "Сливки", "amount": "50 мл"}]),
+            {"sku": "", "title": "Без артикула", "category": "Кофе", "price": "1"},
+        ])
+        err = StringIO()
+        call_command("import_catalog", feed, stdout=StringIO(), stderr=err)
+
+        product.refresh_from_db()
+        self.assertEqual(product.price, Decimal("120.00"))
+        self.assertEqual(product.get_price(), Decimal("120.00"))
+        self.assertEqual((product.stock.quantity, product.stock.reserved), (8, 2))
+        self.assertEqual([link.ingredient.title for link in product.ingredients.all()], ["Сливки"])
+        self.assertTrue(Ingredient.objects.get(title="Молоко").is_allergen)
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertIn("Строка 2", err.getvalue())
+        self.assertEqual(self.client.get(reverse("product_list"), {"search": "сливки"}).data["results"][0]["id"], product.id)
+
+    def test_import_refreshes_index_payload(self):
+        cache.clear()
+        self.client.get(reverse("index"))
+        call_command("import_catalog", self.write_feed("feed.jsonl", [self.row("A1", category="Чай")]), stdout=StringIO())
+        titles = [row["title"] for row in self.client.get(reverse("index")).data["categories"]]
+        self.assertIn("Чай", titles)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def import_rows(prefix, count):
+            rows = [(i, self.row(f"{prefix}{i}", category=f"Категория {i}")) for i in range(count)]
+            CatalogImporter().import_rows(rows, batch_size=100)
+
+        import_rows("warmup", 1)
+        with self.assertNumQueries(17):
+            import_rows("B", 3)
+        with self.assertNumQueries(17):
+            import_rows("C", 30)
+
+    def test_export_round_trip(self):
+        call_command("import_catalog", self.write_feed("feed.jsonl", [
+            self.row("A1", new_price="90.00", is_best_seller=True),
+            self.row("A2", ingredients=[]),
+        ]), stdout=StringIO())
+
+        for name in ("catalog.csv", "catalog.jsonl"):
+            call_command("export_catalog", self.path(name), stderr=StringIO())
+            Product.objects.update(price=Decimal("1.00"), new_price=None, is_best_seller=False)
+            call_command("import_catalog", self.path(name), stdout=StringIO())
+
+            first = Product.objects.get(sku="A1")
+            self.assertEqual((first.price, first.new_price, first.is_best_seller), (Decimal("100.00"), Decimal("90.00"), True))
+            self.assertEqual(first.ingredients.get().amount, "150 мл")
+            self.assertFalse(Product.objects.get(sku="A2").ingredients.exists())
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(email="finance@example.com", password="pass12345", is_admin=True)
+        self.client.force_authenticate(self.staff)
+        self.buyer = User.objects.create_user(email="guest@example.com", password="pass12345")
+        category = Category.objects.create(title="Кофе")
+        self.product = Product.objects.create(category=category, title="Латте", price=Decimal("180.00"))
+
+    def order(self, day, items=1):
+        order = Order.objects.create(user=self.buyer, total_price=Decimal("180.00") * items, card_cvv="123")
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(datetime.datetime(2025, 1, day, 12)))
+        OrderItems.objects.bulk_create(
+            OrderItems.from_product(order, self.product, 1) for _ in range(items)
+        )
+        return order
+
+    def export(self, **params):
+        response = self.client.get(reverse("order_export"), params)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_streams_orders_in_range_as_csv(self):
+        self.order(1)
+        inside = self.order(15, items=2)
+        self.order(31)
+
+        with self.assertNumQueries(2):
+            response, body = self.export(**{"from": "2025-01-10", "to": "2025-01-15"})
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        lines = body.strip().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("order_id,created_at,user_email"))
+        self.assertTrue(all(line.startswith(f"{inside.id},") for line in lines[1:]))
+        self.assertNotIn("123", lines[1].split(",")[2:7])
+
+    def test_datetime_end_is_inclusive(self):
+        self.order(1)
+        inside = self.order(15)
+        created_at = timezone.make_aware(datetime.datetime(2025, 1, 15, 12))
+        _, body = self.export(**{"from": "2025-01-10", "to": created_at.isoformat(), "output": "jsonl"})
+        self.assertEqual([json.loads(line)["order_id"] for line in body.splitlines()], [inside.id])
+
+        _, body = self.export(**{"from": "2025-01-10", "to": (created_at - datetime.timedelta(microseconds=1)).isoformat()})
+        self.assertEqual(len(body.strip().splitlines()), 1)
+
+    def test_jsonl_has_nested_items(self):
+        for day in range(1, 6):
+            self.order(day, items=2)
+        _, body = self.export(output="jsonl")
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]["items"][0]["line_total"], "180.00")
+        self.assertNotIn("card_cvv", records[0])
+
+    def test_requires_staff_and_valid_params(self):
+        self.assertEqual(self.client.get(reverse("order_export"), {"to": "вчера"}).status_code, 400)
+        self.client.force_authenticate(self.buyer)
+        self.assertEqual(self.client.get(reverse("order_export")).status_code, 403)
+
+    def test_command_writes_file(self):
+        self.order(3, items=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "orders.csv")
+            call_command("export_orders", path, "--from", "2025-01-01", "--chunk-size", "1", stderr=StringIO())
+            with open(path, encoding="utf-8") as export:
+                self.assertEqual(len(export.read().splitlines()), 4)
+
+
+class SalesRollupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="guest@example.com", password="pass12345")
+        self.staff = User.objects.create_user(email="finance@example.com", password="pass12345", is_admin=True)
+        self.client.force_authenticate(self.user)
+        self.coffee = Category.objects.create(title="Кофе")
+        self.latte = Product.objects.create(category=self.coffee, title="Латте", price=Decimal("180.00"))
+        self.mocha = Product.objects.create(category=self.coffee, title="Мокко", price=Decimal("200.00"))
+
+    def order(self, *lines):
+        order = Order.objects.create(user=self.user, total_price=sum(p.price * q for p, q in lines))
+        OrderItems.objects.bulk_create(OrderItems.from_product(order, product, quantity) for product, quantity in lines)
+        return order
+
+    def pay(self, order):
+        return self.client.post(reverse("order_pay", args=[order.id]), {
+            "payment_method": "Card", "card_number": "4111111111111111", "card_name": "IVAN",
+            "card_expiry": "12/30", "card_cvv": "123",
+        })
+
+    def snapshot(self):
+        return {
+            model.__name__: sorted(model.objects.values_list(
+                "granularity", "bucket", key, "revenue", "units", "order_count"
+            ))
+            for model, key in (
+                (ProductSalesRollup, "product"),
+                (CategorySalesRollup, "category"),
+                (PaymentSalesRollup, "payment_method"),
+            )
+        }
+
+    def test_paid_orders_are_rolled_up_once(self):
+        first = self.order((self.latte, 2), (self.mocha, 1))
+        second = self.order((self.latte, 1))
+        self.order((self.mocha, 5))  # не оплачен
+
+        self.assertEqual(self.pay(first).status_code, 200)
+        self.assertEqual(self.pay(second).status_code, 200)
+        self.assertEqual(self.pay(second).status_code, 400)
+
+        latte = ProductSalesRollup.objects.get(granularity="day", product=self.latte)
+        self.assertEqual((latte.revenue, latte.units, latte.order_count), (Decimal("540.00"), 3, 2))
+        coffee = CategorySalesRollup.objects.get(granularity="hour", category=self.coffee)
+        self.assertEqual((coffee.revenue, coffee.units, coffee.order_count), (Decimal("740.00"), 4, 2))
+        card = PaymentSalesRollup.objects.get(granularity="day")
+        self.assertEqual((card.payment_method, card.order_count), ("Card", 2))
+
+        incremental = self.snapshot()
+        call_command("backfill_sales_rollups", stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_late_payment_lands_in_payment_bucket(self):
+        order = self.order((self.latte, 1))
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - datetime.timedelta(days=3))
+        self.assertEqual(self.pay(order).status_code, 200)
+
+        order.refresh_from_db()
+        self.assertIsNotNone(order.paid_at)
+        latte = ProductSalesRollup.objects.get(granularity="day", product=self.latte)
+        self.assertEqual(latte.bucket, bucket_start(order.paid_at, "day"))
+
+        incremental = self.snapshot()
+        call_command("backfill_sales_rollups", stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_staff_dashboard_reads_rollups(self):
+        self.pay(self.order((self.latte, 2), (self.mocha, 1)))
+
+        self.assertEqual(self.client.get(reverse("sales_analytics")).status_code, 403)
+        self.client.force_authenticate(self.staff)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("sales_analytics"), {"group_by": "product"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row["title"], row["revenue"], row["units"]) for row in response.data["results"]],
+            [("Латте", Decimal("360.00"), 2), ("Мокко", Decimal("200.00"), 1)],
+        )
+        total = self.client.get(reverse("sales_analytics"), {"granularity": "hour"}).data["results"]
+        self.assertEqual([(row["revenue"], row["order_count"]) for row in total], [(Decimal("560.00"), 1)])
+        self.assertEqual(self.client.get(reverse("sales_analytics"), {"group_by": "user"}).status_code, 400)
+
+
+class BestSellerTests(APITestCase):
+    def setUp(self):
+        coffee = Category.objects.create(title="Кофе")
+        desserts = Category.objects.create(title="Десерты")
+        self.latte = Product.objects.create(category=coffee, title="Латте", price=Decimal("180.00"))
+        self.mocha = Product.objects.create(category=coffee, title="Мокко", price=Decimal("200.00"))
+        self.cake = Product.objects.create(
+            category=desserts, title="Медовик", price=Decimal("250.00"), is_best_seller=True
+        )
+        self.day = datetime.date(2025, 1, 10)
+
+    def sold(self, product, day, units):
+        ProductSalesRollup.objects.create(
+            granularity="day", product=product, units=units, revenue=product.price * units, order_count=units,
+            bucket=timezone.make_aware(datetime.datetime.combine(self.day + datetime.timedelta(days=day), datetime.time.min)),
+        )
+
+    def ranking(self, category=None):
+        return [product.title for product in BestSeller.top_products(category=category)]
+
+    def test_sliding_window_matches_full_rebuild(self):
+        self.sold(self.latte, 0, 10)
+        self.sold(self.mocha, 1, 4)
+        self.sold(self.cake, 2, 3)
+        self.sold(self.mocha, 3, 2)
+
+        advance_window(self.day + datetime.timedelta(days=2), window_days=3)
+        materialize(top=2)
+        self.assertEqual(self.ranking(), ["Латте", "Мокко"])
+
+        # День 0 выпадает из окна, день 3 добавляется
+        advance_window(self.day + datetime.timedelta(days=3), window_days=3)
+        materialize(top=2)
+        self.assertEqual(self.ranking(), ["Мокко", "Медовик"])
+        incremental = sorted(ProductSalesWindow.objects.values_list("product", "units", "revenue"))
+
+        advance_window(self.day + datetime.timedelta(days=3), window_days=3, rebuild=True)
+        self.assertEqual(sorted(ProductSalesWindow.objects.values_list("product", "units", "revenue")), incremental)
+        self.assertEqual(self.ranking(self.cake.category_id), ["Медовик"])
+
+    def test_index_reads_ranking_and_falls_back_to_flag(self):
+        cache.clear()
+        self.assertEqual([p["title"] for p in self.client.get(reverse("index")).data["best_sellers"]], ["Медовик"])
+
+        self.sold(self.mocha, 0, 1)
+        advance_window(self.day, window_days=7)
+        materialize()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.ranking(), ["Мокко"])
+        self.assertEqual([p["title"] for p in self.client.get(reverse("index")).data["best_sellers"]], ["Мокко"])
+        response = self.client.get(reverse("best_sellers"), {"category": self.mocha.category_id})
+        self.assertEqual([p["title"] for p in response.data], ["Мокко"])
+
+
+class ExplainQueriesTests(APITestCase):
+    def test_reports_every_get_endpoint_and_rolls_back(self):
+        out = StringIO()
+        call_command("explain_queries", stdout=out)
+        self.assertIn("GET /api/orders/ -> 200", out.getvalue())
+        self.assertIn("GET /api/products/?category=", out.getvalue())
+        self.assertFalse(User.objects.exists())
+
+
+class SqliteTuningTests(APITestCase):
+    def test_pragmas_applied_to_file_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(os.path.join(tmp, "db.sqlite3"))
+            apply_pragmas(conn.cursor(), {"journal_mode": "wal", "synchronous": "normal", "busy_timeout": 5000})
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 5000)
+            conn.close()
+
+    def test_bench_tuned_profile_has_fewer_lock_errors(self):
+        out = StringIO()
+        call_command("bench_sqlite_writes", threads=4, transactions=20, products=5, stdout=out)
+        # Точные числа зависят от планировщика потоков: сравниваем профили между собой
+        errors = dict(re.findall(r"(\w+): успешно \d+, ошибок блокировки (\d+)", out.getvalue()))
+        self.assertEqual(set(errors), {"before", "after"})
+        self.assertLessEqual(int(errors["after"]), int(errors["before"]))
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    # Только для проверки in_atomic_block, запросов тесты не делают
+    databases = {"default"}
+
+    def setUp(self):
+        release_primary()
+        self.addCleanup(release_primary)
+        self.router = PrimaryReplicaRouter()
+        self.router.replicas = ["replica_1", "replica_2"]
+
+    def test_catalog_reads_go_to_replicas(self):
+        self.assertIn(self.router.db_for_read(Product), self.router.replicas)
+        self.assertIn(self.router.db_for_read(Category), self.router.replicas)
+
+    def test_basket_and_order_stay_on_primary(self):
+        for model in (Basket, Order, Stock, User, Review, ProductPrice):
+            self.assertEqual(self.router.db_for_read(model), "default")
+        self.assertEqual(self.router.db_for_write(Product), "default")
+        self.assertFalse(self.router.allow_migrate("replica_1", "main"))
+
+    def test_reads_after_write_stay_on_primary(self):
+        self.router.db_for_write(Review)
+        self.assertEqual(self.router.db_for_read(Product), "default")
+        release_primary()
+        self.assertIn(self.router.db_for_read(Product), self.router.replicas)
+
+    def test_reads_inside_transaction_use_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_without_replicas_everything_uses_primary(self):
+        self.router.replicas = []
+        self.assertEqual(self.router.db_for_read(Product), "default")
+
+
+class AsyncCatalogViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(title="Кофе")
+        other = Category.objects.create(title="Десерты")
+        self.products = [
+            Product.objects.create(category=self.category, title=f"Кофе {i}", price=Decimal("100.00"), is_best_seller=i == 0)
+            for i in range(5)
+        ]
+        Product.objects.create(category=other, title="Чизкейк", price=Decimal("250.00"))
+        Stock.objects.update_or_create(product=self.products[0], defaults={"quantity": 3})
+
+    async def test_index_matches_sync_view(self):
+        response = await self.async_client.get(reverse("async_index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["best_sellers"][0]["title"], "Кофе 0")
+        cached = await self.async_client.get(reverse("async_index"), headers={"if-none-match": response["ETag"]})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_index_shares_cache_and_etag_with_sync_view(self):
+        sync = self.client.get(reverse("index"))
+        response = self.client.get(reverse("async_index"))
+        self.assertEqual(response.json(), json.loads(sync.content))
+        self.assertEqual(response["ETag"], sync["ETag"])
+
+    def test_product_list_pages_like_sync_view(self):
+        params = {"category": self.category.pk, "ordering": "-title", "page_size": 2}
+        sync = self.client.get(reverse("product_list"), params).json()
+        response = self.client.get(reverse("async_product_list"), params).json()
+        self.assertEqual(response["results"], sync["results"])
+
+        ids = []
+        while True:
+            ids += [row["id"] for row in response["results"]]
+            if not response["next"]:
+                break
+            response = self.client.get(response["next"]).json()
+            self.assertIsNotNone(response["previous"])
+        self.assertEqual(ids, [product.id for product in reversed(self.products)])
+
+    def test_product_list_cursors_match_drf(self):
+        # Вперёд и обратно по курсорам: каждая страница совпадает со страницей DRF
+        sync = self.client.get(reverse("product_list"), {"page_size": 2, "ordering": "price"}).json()
+        response = self.client.get(reverse("async_product_list"), {"page_size": 2, "ordering": "price"}).json()
+        for link in ("next", "next", "previous"):
+            self.assertEqual(response["results"], sync["results"])
+            sync = self.client.get(sync[link]).json()
+            response = self.client.get(response[link]).json()
+        self.assertEqual(response, {**sync, "next": response["next"], "previous": response["previous"]})
+        self.assertEqual(response["next"].split("?")[1], sync["next"].split("?")[1])
+
+    def test_validators_match_sync_views(self):
+        for sync_name, async_name, kwargs in (
+            ("product_list", "async_product_list", {}),
+            ("product_detail", "async_product_detail", {"pk": self.products[0].pk}),
+        ):
+            sync = self.client.get(reverse(sync_name, kwargs=kwargs), HTTP_ACCEPT="application/json")
+            response = self.client.get(reverse(async_name, kwargs=kwargs))
+            for header in ("ETag", "Last-Modified", "Cache-Control", "Vary"):
+                self.assertEqual(response[header], sync[header])
+            cached = self.client.get(reverse(async_name, kwargs=kwargs), HTTP_IF_NONE_MATCH=sync["ETag"])
+            self.assertEqual(cached.status_code, 304)
+
+    def test_product_detail_hit_uses_async_cache(self):
+        url = reverse("async_product_detail", kwargs={"pk": self.products[0].pk})
+        data = self.client.get(url).json()
+        # Из кэша — без запросов к базе и без перехода в поток
+        with self.assertNumQueries(0), mock.patch("main.cache.sync_to_async", side_effect=AssertionError):
+            self.assertEqual(self.client.get(url).json(), data)
+
+    def test_product_list_hops_to_thread_once(self):
+        with mock.patch("main.async_views.sync_to_async", wraps=sync_to_async) as wrapped:
+            response = self.client.get(reverse("async_product_list"), {"category": self.category.pk})
+        self.assertEqual(len(response.json()["results"]), 5)
+        self.assertEqual(wrapped.call_count, 1)
+
+    def test_product_list_rejects_unknown_category(self):
+        response = self.client.get(reverse("async_product_list"), {"category": 999999})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("category", response.json())
+
+    def test_product_list_bad_cursor_is_404_like_sync_view(self):
+        sync = self.client.get(reverse("product_list"), {"cursor": "garbage"}, HTTP_ACCEPT="application/json")
+        response = self.client.get(reverse("async_product_list"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), json.loads(sync.content))
+
+    def test_product_detail_matches_sync_view(self):
+        for product in (self.products[0], self.products[1]):
+            sync = self.client.get(reverse("product_detail", kwargs={"pk": product.pk})).json()
+            response = self.client.get(reverse("async_product_detail", kwargs={"pk": product.pk}))
+            self.assertEqual(response.json(), sync)
+        self.assertEqual(response.json()["available_quantity"], 0)
+        missing = self.client.get(reverse("async_product_detail", kwargs={"pk": 999999}))
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(self.client.post(reverse("async_index")).status_code, 405)
+
+    def test_bench_reports_both_paths(self):
+        out = StringIO()
+        call_command("bench_async_views", endpoint=["index"], requests=4, client_delay=0, stdout=out)
+        self.assertIn("wsgi:", out.getvalue())
+        self.assertIn("asgi:", out.getvalue())
+
+
+class GoldenOutputTests(APITestCase):
+    """Быстрые списки (main.plans) должны давать тот же JSON, что обычный ListSerializer DRF."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="golden@example.com", password="pass12345")
+        coffee = Category.objects.create(title="Кофе")
+        desserts = Category.objects.create(title="Десерты")
+        self.products = [
+            Product.objects.create(category=coffee, title="Латте", price=Decimal("180.00"), cover="product_cover/latte.jpg"),
+            Product.objects.create(category=coffee, title="Раф", price=Decimal("220.50"), new_price=Decimal("199.90")),
+            Product.objects.create(
+                category=desserts, title="Чизкейк «Нью-Йорк»", price=Decimal("250.00"),
+                rating=Decimal("4.5"), review_count=2,
+            ),
+        ]
+        ProductPrice.objects.filter(product=self.products[0]).delete()
+        for status, product in zip(("Создан", "Оплачен"), self.products):
+            order = Order.objects.create(user=self.user, total_price=Decimal("360.00"), status=status)
+            OrderItems.objects.create(order=order, product=product, quantity=2, line_total=Decimal("360.00"))
+        Order.objects.create(user=self.user, total_price=Decimal("0.00"))
+
+    def render_both(self, serializer_class, instances, query=""):
+        request = Request(APIRequestFactory().get(f"/api/?{query}"))
+        context = {"request": request}
+        fast = serializer_class(instances, many=True, context=context)
+        self.assertIsInstance(fast, PlannedListSerializer)
+        plain = serializers.ListSerializer(instances, child=serializer_class(context=context), context=context)
+        return JSONRenderer().render(fast.data), JSONRenderer().render(plain.data)
+
+    def test_products_byte_identical(self):
+        products = list(Product.objects.select_related("category", "pricing").order_by("id"))
+        for query in ("", "fields=id,title,effective_price", "fields=category,cover"):
+            fast, plain = self.render_both(ProductListSerializer, products, query)
+            self.assertEqual(fast, plain)
+        self.assertIn("http://testserver/media/product_cover/latte.jpg".encode(), fast)
+
+    def test_orders_byte_identical(self):
+        orders = list(Order.objects.prefetch_related("items").order_by("id"))
+        for query in ("fields=id,status", ""):
+            fast, plain = self.render_both(OrderNestedSerializer, orders, query)
+            self.assertEqual(fast, plain)
+        self.assertIn(b'"subtotal":360.0', fast)
+
+    def test_bench_reports_both_lists(self):
+        out = StringIO()
+        call_command("bench_serializers", rows=10, repeat=1, stdout=out)
+        self.assertIn("products:", out.getvalue())
+        self.assertIn("orders:", out.getvalue())
+
+
+class FastJSONRendererTests(APITestCase):
+    def payload(self):
+        product = Product(title="Латте", price=Decimal("180.00"), cover="product_cover/latte.jpg")
+        return {
+            "price": Decimal("180.50"),
+            "utc": datetime.datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            "local": datetime.datetime(2025, 1, 2, 9, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=6))),
+            "naive": datetime.datetime(2025, 1, 2, 3, 4, 5),
+            "day": datetime.date(2025, 1, 2),
+            "duration": datetime.timedelta(minutes=15),
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "lazy": _lazy("Кофе"),
+            "text": "строка\u2028с разделителем",
+            "items": [{"id": 1, "subtotal": Decimal("360.00")}, None, True, 1.5],
+            "cover": product.cover,
+            "empty_cover": Product().cover,
+            7: "нестроковый ключ",
+        }
+
+    def test_matches_drf_json_renderer(self):
+        payload = self.payload()
+        expected = JSONRenderer().render({**payload, "cover": "/media/product_cover/latte.jpg", "empty_cover": None})
+        self.assertIsNotNone(renderers.orjson)
+        self.assertEqual(renderers.FastJSONRenderer().render(payload), expected)
+        self.assertIn(b"\\u2028", expected)
+
+    def test_non_finite_floats_fail_like_drf(self):
+        for value in (float("nan"), float("inf")):
+            payload = {"items": [{"rating": value}], "note": None}
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(payload)
+            with self.assertRaises(ValueError):
+                renderers.FastJSONRenderer().render(payload)
+
+    def test_falls_back_without_orjson(self):
+        payload = self.payload()
+        fast = renderers.FastJSONRenderer().render(payload)
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(renderers.FastJSONRenderer().render(payload), fast)
+        self.assertEqual(
+            renderers.FastJSONRenderer().render({"big": 2 ** 70}), JSONRenderer().render({"big": 2 ** 70})
+        )
+
+    def test_indent_and_api_responses(self):
+        indented = renderers.FastJSONRenderer().render({"a": 1}, "application/json; indent=2")
+        self.assertEqual(indented, b'{\n  "a": 1\n}')
+        response = self.client.get(reverse("product_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.accepted_renderer, renderers.FastJSONRenderer)
+
+    def test_bench_output_matches(self):
+        out = StringIO()
+        call_command("bench_renderers", orders=5, repeat=2, stdout=out)
+        self.assertIn("вывод совпадает с DRF: да", out.getvalue())
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title="Кофе")
+        self.product = Product.objects.create(category=self.category, title="Латте", price=Decimal("180.00"))
+        Stock.objects.update_or_create(product=self.product, defaults={"quantity": 5})
+
+    def test_list_returns_validators_and_304(self):
+        url = reverse("product_list")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("Last-Modified", response)
+
+        # 304 без сериализации: только агрегат валидаторов
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], response["ETag"])
+        modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(modified.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        url = reverse("product_list")
+        etag = self.client.get(url)["ETag"]
+        self.category.title = "Кофе и чай"
+        self.category.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(url)["ETag"]
+        Product.apply_review_delta(self.product.pk, 1, 5)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(url)["ETag"]
+        Product.objects.create(category=self.category, title="Раф", price=Decimal("200.00"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_tracks_stock(self):
+        url = reverse("product_detail", args=[self.product.pk])
+        response = self.client.get(url)
+        self.assertIn("max-age=0", response["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        stock.reserve(User.objects.create_user(email="buyer@example.com", password="pass12345").pk, {self.product.pk: 1})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["available_quantity"], 4)
+        self.assertEqual(self.client.get(reverse("product_detail", args=[999999])).status_code, 404)
+
+    def test_categories_endpoint(self):
+        response = self.client.get(reverse("category_list"))
+        self.assertEqual(response.data, [{"id": self.category.pk, "title": "Кофе"}])
+        self.assertEqual(self.client.get(reverse("category_list"), HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+
+class ProductDetailCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(title="Кофе")
+        self.product = Product.objects.create(category=self.category, title="Латте", price=Decimal("180.00"))
+        self.stock = Stock.objects.update_or_create(product=self.product, defaults={"quantity": 10})[0]
+        self.milk = Ingredient.objects.create(title="Молоко")
+        ProductIngredient.objects.create(product=self.product, ingredient=self.milk, amount="150 мл")
+        self.url = reverse("product_detail", args=[self.product.pk])
+
+    def detail(self):
+        return self.client.get(self.url).data
+
+    def test_payload_and_cache_hit(self):
+        data = self.detail()
+        self.assertEqual(data["ingredients"], [{"id": self.milk.pk, "title": "Молоко", "is_allergen": False, "amount": "150 мл"}])
+        self.assertEqual((data["available_quantity"], data["stock_band"]), (10, "in_stock"))
+        # Из кэша: и тело, и валидаторы берутся без запросов к базе
+        with self.assertNumQueries(0):
+            self.assertEqual(self.detail(), data)
+
+    def test_allergen_change_invalidates_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.milk.is_allergen = True
+        self.milk.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["ingredients"][0]["is_allergen"])
+
+        etag = response["ETag"]
+        ProductIngredient.objects.create(product=self.product, ingredient=Ingredient.objects.create(title="Сироп"))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_product_leaves_no_version(self):
+        url = reverse("product_detail", args=[999999])
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH="*").status_code, 404)
+        self.assertIsNone(cache.get(PRODUCT_VERSION_KEY.format(pk=999999)))
+
+        # Версия истекла: карточка собирается заново и снова получает ETag
+        cache.delete(PRODUCT_VERSION_KEY.format(pk=self.product.pk))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH="*").status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH="*").status_code, 304)
+
+    def test_dependencies_invalidate(self):
+        self.detail()
+        self.category.title = "Кофе и чай"
+        self.category.save()
+        self.assertEqual(self.detail()["category"]["title"], "Кофе и чай")
+
+        self.milk.is_allergen = True
+        self.milk.save()
+        self.assertTrue(self.detail()["ingredients"][0]["is_allergen"])
+
+        ProductIngredient.objects.create(product=self.product, ingredient=Ingredient.objects.create(title="Эспрессо"))
+        self.assertEqual(len(self.detail()["ingredients"]), 2)
+
+        stock.reserve(User.objects.create_user(email="buyer@example.com", password="pass12345").pk, {self.product.pk: 6})
+        self.assertEqual((self.detail()["available_quantity"], self.detail()["stock_band"]), (4, "low"))
+
+        today = timezone.localdate()
+        promotion = Promotion.objects.create(
+            title="Скидка", discount_percent=50, start_date=today, end_date=today + datetime.timedelta(days=1),
+        )
+        promotion.products.add(self.product)
+        self.assertEqual(Decimal(self.detail()["effective_price"]), Decimal("90.00"))
+
+        Review.objects.create(user=User.objects.get(email="buyer@example.com"), product=self.product, rating=4)
+        self.assertEqual(self.detail()["review_count"], 1)
+
+    def test_warm_command(self):
+        out = StringIO()
+        call_command("warm_product_cache", "--chunk-size", "1", stdout=out)
+        self.assertIn("В кэше карточек товаров: 1", out.getvalue())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.detail()["title"], "Латте")
@@ -1,19 +1,32 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("index/", views.IndexAPIView.as_view(), name="index"),
 
+    path("categories/", views.CategoryListAPIView.as_view(), name="category_list"),
+
     path("products/", views.ProductListAPIView.as_view(), name="product_list"),
+    path("products/best-sellers/", views.BestSellerListAPIView.as_view(), name="best_sellers"),
     path("products/<int:pk>/", views.ProductDetailAPIView.as_view(), name="product_detail"),
 
     path("basket/items/", views.BasketItemsListView.as_view(), name="basket_items_list"),
     path("basket/items/add/", views.BasketItemsCreateView.as_view(), name="basket_items_create"),
-    path("basket/items/<int:pk>/", views.BasketItemDeleteView.as_view(), name="basket_item_delete"),
+    path("basket/items/batch/", views.BasketBatchView.as_view(), name="basket_items_batch"),
+    path("basket/items/<int:pk>/", views.BasketItemDetailView.as_view(), name="basket_item_delete"),
 
     path("checkout/", views.CheckoutAPIView.as_view(), name="checkout"),
     path("orders/", views.OrderListAPIView.as_view(), name="order_list"),
+    path("orders/export/", views.OrderExportAPIView.as_view(), name="order_export"),
     path("orders/<int:id>/", views.OrderDetailAPIView.as_view(), name="order_detail"),
+    path("orders/<int:id>/reorder/", views.OrderReorderAPIView.as_view(), name="order_reorder"),
     path("pay-order/<int:order_id>/", views.OrderPaymentView.as_view(), name="order_pay"),
     path("orders/<int:id>/receipt/", views.OrderReceiptAPIView.as_view(), name="order_receipt"),
+
+    path("analytics/sales/", views.SalesAnalyticsAPIView.as_view(), name="sales_analytics"),
+
+    # Те же ответы, что у index/ и products/, для запуска под ASGI
+    path("async/index/", async_views.index, name="async_index"),
+    path("async/products/", async_views.product_list, name="async_product_list"),
+    path("async/products/<int:pk>/", async_views.product_detail, name="async_product_detail"),
 ]
@@ -1,69 +1,118 @@
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
+import datetime
 import random
 import uuid
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
+from .analytics import ROLLUPS, TRUNCATE, sales_report
+from .cache import get_index_payload, get_product_detail
+from .conditional import ConditionalGetMixin
+from .exports import EXPORT_FORMATS, buffered, iter_orders, parse_bound, stream_orders
 from .filters import ProductFilter
+from .invalidation import aproduct_detail_validators, product_detail_validators
+from .pagination import OrderCursorPagination, ProductCursorPagination
 from .models import *
 from .serializers import *
+from .services import CheckoutError, checkout_basket, mark_order_paid, remove_basket_item, reorder
 
-class IndexAPIView(generics.GenericAPIView):
-    filter_backends = [DjangoFilterBackend]
 
-    def get(self, request):
-        top_banner = Banner.objects.filter(location="index_head")
-        top_banner_data = BannerListSerializer(top_banner, many=True).data
+def etag_matches(request, etag):
+    tags = parse_etags(request.headers.get("If-None-Match", ""))
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
 
-        best_sellers = Product.objects.filter(is_best_seller=True)[:5]
-        best_sellers_data = ProductListSerializer(best_sellers, many=True).data
 
-        coffee_shop = CoffeeShop.objects.first()
-        coffee_shop_data = CoffeeShopSerializer(coffee_shop).data if coffee_shop else None
+def absolute_cover(request, data):
+    """Кэшированная карточка хранит обложку относительной ссылкой — как без кэша, отдаём абсолютную."""
+    if not data["cover"]:
+        return data
+    return {**data, "cover": request.build_absolute_uri(data["cover"])}
 
-        quote = "Жизнь слишком коротка, чтобы пить плохой кофе ☕️"
 
-        categories = Category.objects.all()
-        categories_data = CategorySerializer(categories, many=True).data
+class IndexAPIView(generics.GenericAPIView):
+    filter_backends = [DjangoFilterBackend]
 
-        footer = {
-            "address": "ул. Примерная, 12",
-            "email": "mochamuse@gmail.com",
-            "phone": "+996 555 123456",
-            "social": {
-                "instagram": "https://instagram.com",
-                "facebook": "https://facebook.com"
-            }
-        }
+    def get(self, request):
+        data, etag = get_index_payload()
 
-        return Response({
-            "top_banner": top_banner_data,
-            "best_sellers": best_sellers_data,
-            "coffee_shop": coffee_shop_data,
-            "quote": quote,
-            "categories": categories_data,
-            "footer": footer
-        })
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response["ETag"] = etag
+        return response
+
+
+class CategoryListAPIView(ConditionalGetMixin, generics.ListAPIView):
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+    permission_classes = [permissions.AllowAny]
 
 
-class ProductListAPIView(generics.ListAPIView):
+class ProductListAPIView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Каталог товаров. С ?search= выдача идёт по релевантности и ограничена
+    main.search.MAX_RESULTS лучшими совпадениями — уточните запрос, если
+    нужного товара в ней нет.
+    """
     queryset = Product.objects.all()
     serializer_class = ProductListSerializer
     permission_classes = [permissions.AllowAny]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = ProductFilter
-    search_fields = ['title', 'description']
-    ordering_fields = ['price', 'title', 'id']
+    ordering_fields = ['price', 'title', 'id', 'rating', 'review_count']
+    pagination_class = ProductCursorPagination
+    validator_fields = ("updated_at", "category__updated_at", "pricing__updated_at")
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if is_field_requested(self.request, "category"):
+            queryset = queryset.select_related("category")
+        if is_field_requested(self.request, "effective_price"):
+            queryset = queryset.select_related("pricing")
+        return queryset
 
-class ProductDetailAPIView(generics.RetrieveAPIView):
-    queryset = Product.objects.all()
+
+class BestSellerListAPIView(APIView):
+    """Бестселлеры за скользящее окно продаж: ?category=<id> — внутри категории."""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        category = request.query_params.get("category")
+        if category is not None and not category.isdigit():
+            return Response({"detail": "category должен быть id категории"}, status=400)
+        products = BestSeller.top_products(category=int(category) if category else None)
+        return Response(ProductListSerializer(products, many=True, context={"request": request}).data)
+
+
+class ProductDetailAPIView(ConditionalGetMixin, generics.RetrieveAPIView):
+    queryset = Product.objects.select_related("category", "pricing", "stock")
     serializer_class = ProductDetailSerializer
     permission_classes = [permissions.AllowAny]
+    # Остаток меняется с каждой корзиной: кэшам разрешено хранить, но сверяться каждый раз
+    cache_max_age = 0
+
+    def get_validators(self):
+        # Карточка зависит и от состава с аллергенами, у которых нет updated_at:
+        # валидаторы берём из версии её кэша (main.invalidation)
+        return product_detail_validators(self.kwargs["pk"], self.request.accepted_renderer.format)
+
+    async def aget_validators(self):
+        return await aproduct_detail_validators(self.kwargs["pk"], self.request.accepted_renderer.format)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Карточка из кэша по версии товара (main.cache.get_product_detail)
+        data = get_product_detail(self.kwargs["pk"])
+        if data is None:
+            raise Http404
+        return Response(absolute_cover(request, data))
 
 
 class BasketItemsCreateView(generics.CreateAPIView):
@@ -74,19 +123,18 @@ class BasketItemsCreateView(generics.CreateAPIView):
         return {"request": self.request}
 
     def perform_create(self, serializer):
-        basket, _ = Basket.objects.get_or_create(user=self.request.user)
-        product = serializer.validated_data["product"]
-        quantity = serializer.validated_data["quantity"]
+        serializer.save()
 
-        item, created = BasketItems.objects.get_or_create(
-            basket=basket, product=product,
-            defaults={"quantity": quantity}
-        )
-        if not created:
-            item.quantity += quantity
-            item.save()
 
-        basket.update_total()
+class BasketBatchView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = BasketBatchSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        basket = serializer.save()
+        return Response(BasketSerializer(basket, context=self.get_serializer_context()).data)
 
 
 class BasketItemsListView(generics.ListAPIView):
@@ -94,17 +142,26 @@ class BasketItemsListView(generics.ListAPIView):
     serializer_class = BasketItemsSerializer
 
     def get_queryset(self):
-        basket, _ = Basket.objects.get_or_create(user=self.request.user)
-        return basket.items.all()
+        return (
+            BasketItems.objects.filter(basket__user=self.request.user)
+            .select_related("product__category", "product__pricing")
+            .order_by("id")
+        )
 
 
-class BasketItemDeleteView(generics.DestroyAPIView):
+class BasketItemDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
-    serializer_class = BasketItemsSerializer
+
+    def get_serializer_class(self):
+        if self.request.method in ("PUT", "PATCH"):
+            return BasketItemUpdateSerializer
+        return BasketItemsSerializer
 
     def get_queryset(self):
-        basket, _ = Basket.objects.get_or_create(user=self.request.user)
-        return basket.items.all()
+        return BasketItems.objects.filter(basket__user=self.request.user).select_related("basket", "product__category", "product__pricing")
+
+    def perform_destroy(self, instance):
+        remove_basket_item(instance)
 
 
 class CheckoutAPIView(generics.GenericAPIView):
@@ -115,18 +172,12 @@ class CheckoutAPIView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        basket = get_object_or_404(Basket, id=serializer.validated_data["basket_id"], user=request.user)
-        if not basket.items.exists():
-            return Response({"detail": "Корзина пуста."}, status=400)
-
-        total = sum((item.product.new_price or item.product.price) * item.quantity for item in basket.items.all())
-        order = Order.objects.create(user=request.user, total_price=total, status="Создан")
-
-        for item in basket.items.all():
-            OrderItems.objects.create(order=order, product=item.product, quantity=item.quantity)
-
-        basket.items.all().delete()
-        basket.update_total()
+        try:
+            order = checkout_basket(request.user, serializer.validated_data["basket_id"])
+        except Basket.DoesNotExist:
+            raise Http404
+        except CheckoutError as e:
+            return Response({"detail": str(e)}, status=400)
 
         return Response({"detail": f"Заказ #{order.id} создан успешно."}, status=201)
 
@@ -134,9 +185,13 @@ class CheckoutAPIView(generics.GenericAPIView):
 class OrderListAPIView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderNestedSerializer
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by("-created_at")
+        queryset = Order.objects.filter(user=self.request.user)
+        if is_field_requested(self.request, "items"):
+            queryset = queryset.prefetch_related("items")
+        return queryset
 
 
 class OrderDetailAPIView(generics.RetrieveAPIView):
@@ -145,15 +200,56 @@ class OrderDetailAPIView(generics.RetrieveAPIView):
     lookup_field = "id"
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return (
+            Order.objects.filter(user=self.request.user)
+            .prefetch_related("items")
+        )
+
+
+class OrderReorderAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, id):
+        order = get_object_or_404(Order, id=id, user=request.user)
+        basket, unavailable = reorder(request.user, order)
+        return Response({
+            "basket": BasketSerializer(basket, context={"request": request}).data,
+            "unavailable": unavailable,
+        })
+
+
+class OrderExportAPIView(APIView):
+    """
+    Выгрузка заказов для бухгалтерии: ?from=2025-01-01&to=2025-01-31&output=csv|jsonl.
+    Ответ отдаётся потоком, заказы читаются из базы пачками.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        fmt = request.query_params.get("output", "csv")
+        if fmt not in EXPORT_FORMATS:
+            return Response({"detail": f"Формат должен быть одним из: {', '.join(EXPORT_FORMATS)}"}, status=400)
+        try:
+            start = parse_bound(request.query_params.get("from"))
+            end = parse_bound(request.query_params.get("to"), end=True)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        response = StreamingHttpResponse(
+            buffered(stream_orders(iter_orders(start, end), fmt)), content_type=EXPORT_FORMATS[fmt]
+        )
+        response["Content-Disposition"] = f'attachment; filename="orders.{fmt}"'
+        return response
 
 
 class OrderPaymentView(APIView):
-    def post(self, request, pk):
+    def post(self, request, order_id):
         try:
-            order = Order.objects.get(pk=pk)
+            order = Order.objects.get(pk=order_id)
         except Order.DoesNotExist:
             return Response({"error": "Заказ не найден"}, status=status.HTTP_404_NOT_FOUND)
+        if order.status in Order.PAID_STATUSES:
+            return Response({"error": "Заказ уже оплачен"}, status=400)
 
         serializer = OrderPaySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -164,10 +260,9 @@ class OrderPaymentView(APIView):
             card_number = serializer.validated_data["card_number"]
 
             if card_number.startswith("4"):
-                order.transaction_id = str(uuid.uuid4())[:12]  # генерим ID транзакции
-                order.status = "Оплачен"
-                order.payment_method = "Card"
-                order.save()
+                # генерим ID транзакции
+                if not mark_order_paid(order, transaction_id=str(uuid.uuid4())[:12], payment_method="Card"):
+                    return Response({"error": "Заказ уже оплачен"}, status=400)
                 return Response(
                     {
                         "message": "Оплата картой прошла успешно ✅",
@@ -204,9 +299,8 @@ class OrderPaymentView(APIView):
                 )
 
             if otp == order.confirm_code:
-                order.transaction_id = str(uuid.uuid4())[:12]
-                order.status = "Оплачен"
-                order.save()
+                if not mark_order_paid(order, transaction_id=str(uuid.uuid4())[:12]):
+                    return Response({"error": "Заказ уже оплачен"}, status=400)
                 return Response(
                     {
                         "message": "Оплата через MBank подтверждена ✅",
@@ -219,6 +313,38 @@ class OrderPaymentView(APIView):
 
         return Response({"error": "Неверный метод оплаты"}, status=400)
 
+class SalesAnalyticsAPIView(APIView):
+    """
+    Продажи для дашбордов из предагрегированных сводок:
+    ?granularity=day|hour&group_by=total|product|category|payment_method&from=&to=.
+    По умолчанию — последние 30 дней по дням или последние 48 часов по часам.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        granularity = request.query_params.get("granularity", "day")
+        group_by = request.query_params.get("group_by", "total")
+        if granularity not in TRUNCATE:
+            return Response({"detail": "granularity должен быть day или hour"}, status=400)
+        if group_by != "total" and group_by not in ROLLUPS:
+            return Response({"detail": f"group_by должен быть одним из: total, {', '.join(ROLLUPS)}"}, status=400)
+        try:
+            end = parse_bound(request.query_params.get("to"), end=True) or timezone.now()
+            start = parse_bound(request.query_params.get("from"))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        if start is None:
+            start = end - (datetime.timedelta(days=30) if granularity == "day" else datetime.timedelta(hours=48))
+
+        return Response({
+            "granularity": granularity,
+            "group_by": group_by,
+            "from": start,
+            "to": end,
+            "results": sales_report(granularity, group_by, start, end),
+        })
+
+
 class OrderReceiptAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -229,33 +355,32 @@ class OrderReceiptAPIView(APIView):
         items = []
         subtotal = 0
 
-        for item in order.items.select_related("product"):
-            price = item.product.new_price or item.product.price
-            total = float(price) * item.quantity
+        for item in order.items.all():
+            total = float(item.line_total)
             subtotal += total
             items.append({
-                "title": item.product.title,
+                "title": item.title,
                 "quantity": item.quantity,
-                "price": float(price),
+                "price": float(item.price),
                 "line_total": total,
                 "options": []
             })
 
         receipt = {
-            "success": order.status == "paid",
+            "success": order.status == "Оплачен",
             "title": "Thank you!",
-            "message": "Your transaction was successful" if order.status == "paid" else "Waiting for payment",
+            "message": "Your transaction was successful" if order.status == "Оплачен" else "Waiting for payment",
             "transaction_id": order.transaction_id,
             "date": created.strftime("%d %B %y"),
             "time": created.strftime("%I:%M %p"),
             "items": items,
             "payment_summary": {
                 "price": round(subtotal, 2),
-                "voucher": float(order.voucher_amount or 0),
+                "voucher": round(max(subtotal - float(order.total_price), 0), 2),
                 "total": float(order.total_price)
             },
             "payment_method": order.payment_method or "Card",
-            "schedule_pickup": order.pickup_at.strftime("%I.%M %p") if order.pickup_at else None
+            "schedule_pickup": None
         }
 
         return Response(receipt)
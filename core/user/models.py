@@ -68,6 +68,9 @@ class OTP(models.Model):
     class Meta:
         verbose_name = "Одноразовый код"
         verbose_name_plural = "Одноразовые коды"
+        indexes = [
+            models.Index(fields=['user', 'code'], name='otp_user_code'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.code}"